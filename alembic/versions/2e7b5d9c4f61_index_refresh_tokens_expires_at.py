@@ -0,0 +1,28 @@
+"""index refresh tokens expires_at
+
+Revision ID: 2e7b5d9c4f61
+Revises: 9d4a6c2e8b17
+Create Date: 2026-10-19 23:41:52.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e7b5d9c4f61'
+down_revision: Union[str, Sequence[str], None] = '9d4a6c2e8b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_refresh_tokens_expires_at'), 'refresh_tokens', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_refresh_tokens_expires_at'), table_name='refresh_tokens')
@@ -0,0 +1,43 @@
+"""add chat archive
+
+Revision ID: 3d7b9e2a4c18
+Revises: 8c3e7a1f2b60
+Create Date: 2026-10-19 16:52:04.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d7b9e2a4c18'
+down_revision: Union[str, Sequence[str], None] = '8c3e7a1f2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chat_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.String(), nullable=False),
+    sa.Column('first_id', sa.Integer(), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('blob', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_chat_archive_group_id_last_id', 'chat_archive', ['group_id', 'last_id'], unique=False)
+    op.create_index('ix_chat_messages_group_id_id', 'chat_messages', ['group_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_group_id_id', table_name='chat_messages')
+    op.drop_index('ix_chat_archive_group_id_last_id', table_name='chat_archive')
+    op.drop_table('chat_archive')
@@ -0,0 +1,28 @@
+"""index chat messages by timestamp
+
+Revision ID: 4b6d8f0a2c95
+Revises: c8e1f3a5b702
+Create Date: 2026-10-19 21:26:44.815230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b6d8f0a2c95'
+down_revision: Union[str, Sequence[str], None] = 'c8e1f3a5b702'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_chat_messages_group_id_timestamp', 'chat_messages', ['group_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_group_id_timestamp', table_name='chat_messages')
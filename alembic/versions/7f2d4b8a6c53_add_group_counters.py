@@ -0,0 +1,46 @@
+"""add group counters
+
+Revision ID: 7f2d4b8a6c53
+Revises: e5a92b7c1d34
+Create Date: 2026-10-19 19:12:37.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f2d4b8a6c53'
+down_revision: Union[str, Sequence[str], None] = 'e5a92b7c1d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('groups', sa.Column('member_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('groups', sa.Column('expense_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('groups', sa.Column('total_spent', sa.Float(), server_default='0', nullable=False))
+    op.add_column('groups', sa.Column('last_activity_at', sa.DateTime(), nullable=True))
+
+    # backfill from the tables the counters summarize
+    op.execute("""
+        UPDATE groups SET
+            member_count = (SELECT count(*) FROM group_members WHERE group_members.group_id = groups.id),
+            expense_count = (SELECT count(*) FROM expenses WHERE expenses.group_id = groups.id),
+            total_spent = (SELECT coalesce(sum(amount), 0) FROM expenses WHERE expenses.group_id = groups.id),
+            last_activity_at = coalesce(
+                (SELECT max(timestamp) FROM chat_messages WHERE chat_messages.group_id = groups.id),
+                (SELECT max(date) FROM expenses WHERE expenses.group_id = groups.id)
+            )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('groups', 'last_activity_at')
+    op.drop_column('groups', 'total_spent')
+    op.drop_column('groups', 'expense_count')
+    op.drop_column('groups', 'member_count')
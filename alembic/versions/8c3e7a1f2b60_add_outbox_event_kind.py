@@ -0,0 +1,30 @@
+"""add outbox event kind
+
+Revision ID: 8c3e7a1f2b60
+Revises: 5b1f0c2d9e41
+Create Date: 2026-10-19 11:02:17.530912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c3e7a1f2b60'
+down_revision: Union[str, Sequence[str], None] = '5b1f0c2d9e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_outbox', sa.Column('kind', sa.String(), nullable=True))
+    op.add_column('chat_outbox', sa.Column('data', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_outbox', 'data')
+    op.drop_column('chat_outbox', 'kind')
@@ -0,0 +1,30 @@
+"""add chat message event kind
+
+Revision ID: 9d4a6c2e8b17
+Revises: 4b6d8f0a2c95
+Create Date: 2026-10-19 23:12:08.406217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4a6c2e8b17'
+down_revision: Union[str, Sequence[str], None] = '4b6d8f0a2c95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('kind', sa.String(), nullable=True))
+    op.add_column('chat_messages', sa.Column('data', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'data')
+    op.drop_column('chat_messages', 'kind')
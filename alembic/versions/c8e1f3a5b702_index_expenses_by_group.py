@@ -0,0 +1,28 @@
+"""index expenses by group
+
+Revision ID: c8e1f3a5b702
+Revises: 7f2d4b8a6c53
+Create Date: 2026-10-19 19:48:05.318822
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e1f3a5b702'
+down_revision: Union[str, Sequence[str], None] = '7f2d4b8a6c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_expenses_group_id_id', 'expenses', ['group_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_expenses_group_id_id', table_name='expenses')
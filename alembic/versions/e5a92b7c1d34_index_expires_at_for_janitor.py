@@ -0,0 +1,30 @@
+"""index expires_at for janitor
+
+Revision ID: e5a92b7c1d34
+Revises: a41c6f5d8e27
+Create Date: 2026-10-19 18:04:12.661905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a92b7c1d34'
+down_revision: Union[str, Sequence[str], None] = 'a41c6f5d8e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_group_invites_expires_at'), 'group_invites', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_otp_verifications_expires_at'), 'otp_verifications', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_otp_verifications_expires_at'), table_name='otp_verifications')
+    op.drop_index(op.f('ix_group_invites_expires_at'), table_name='group_invites')
@@ -23,6 +23,9 @@ const GroupChat = () => {
   const timeUpdateIntervalRef = useRef(null);
   const autoRefreshIntervalRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
+  const reconnectDelayRef = useRef(null);
+  const lastMessageIdRef = useRef(null);
+  const currentUserIdRef = useRef(null);
 
   // Update timestamps every minute
   useEffect(() => {
@@ -85,6 +88,17 @@ const GroupChat = () => {
     };
   }, [groupId, autoRefresh, isConnected]);
 
+  useEffect(() => {
+    currentUserIdRef.current = currentUser?.id ?? null;
+  }, [currentUser]);
+
+  // Remember the newest message so a reconnect can resume from it
+  useEffect(() => {
+    if (messages.length > 0) {
+      lastMessageIdRef.current = messages[messages.length - 1].id;
+    }
+  }, [messages]);
+
   // WebSocket connection
   const connectWebSocket = useCallback(() => {
     if (!groupId) return;
@@ -104,7 +118,10 @@ const GroupChat = () => {
       ? baseUrl.replace("https", "wss")
       : baseUrl.replace("http", "ws");
 
-    const wsUrl = `${wsBaseUrl}/chat/ws/${groupId}?token=${token}`;
+    const resume = lastMessageIdRef.current
+      ? `&last_id=${lastMessageIdRef.current}`
+      : "";
+    const wsUrl = `${wsBaseUrl}/chat/ws/${groupId}?token=${token}${resume}`;
     const ws = new WebSocket(wsUrl);
     wsRef.current = ws;
 
@@ -120,6 +137,17 @@ const GroupChat = () => {
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
 
+      if (data.event === "ping") {
+        ws.send(JSON.stringify({ event: "pong" }));
+        return;
+      }
+
+      // server is restarting and picked when we should come back
+      if (data.event === "reconnect") {
+        reconnectDelayRef.current = data.retry_after_ms;
+        return;
+      }
+
       if (data.event === "message") {
         const serverMsg = {
           id: data.message.id,
@@ -151,7 +179,10 @@ const GroupChat = () => {
       }
 
       if (data.event === "typing") {
-        setTypingUser(data.user);
+        const others = (data.users || [])
+          .filter((u) => u.id !== currentUserIdRef.current)
+          .map((u) => u.name);
+        setTypingUser(others.join(", "));
         clearTimeout(typingTimeoutRef.current);
         typingTimeoutRef.current = setTimeout(() => {
           setTypingUser("");
@@ -162,12 +193,30 @@ const GroupChat = () => {
     ws.onerror = (err) => {
       console.error("WebSocket error:", err);
     };
+
+    ws.onclose = (event) => {
+      setIsConnected(false);
+      if (wsRef.current !== ws || event.code === 1008) return;
+
+      // 1012 is a restart; spread reconnects so the new workers aren't stampeded
+      let delay = reconnectDelayRef.current;
+      reconnectDelayRef.current = null;
+      if (delay == null) {
+        delay = event.code === 1012
+          ? 500 + Math.random() * 10000
+          : 1000 + Math.random() * 2000;
+      }
+      reconnectTimeoutRef.current = setTimeout(connectWebSocket, delay);
+    };
   }, [groupId]);
 
   useEffect(() => {
     connectWebSocket();
 
     return () => {
+      if (wsRef.current) {
+        wsRef.current.onclose = null;
+      }
       if (
         wsRef.current &&
         (wsRef.current.readyState === WebSocket.OPEN ||
@@ -215,7 +264,6 @@ const GroupChat = () => {
       wsRef.current.send(
         JSON.stringify({
           event: "message",
-          user_id: currentUser.id,
           content: newMessage.trim(),
         })
       );
@@ -300,7 +348,7 @@ const GroupChat = () => {
           );
         })}
 
-        {typingUser && typingUser !== currentUser?.name && (
+        {typingUser && (
           <div className="typing-indicator">{typingUser} is typing...</div>
         )}
 
@@ -87,7 +87,7 @@ const GroupDashboard = () => {
             <div className="stat-card">
               <div className="stat-icon">💸</div>
               <div className="stat-info">
-                <div className="stat-number">{groupData.expenses.length}</div>
+                <div className="stat-number">{groupData.group.expense_count}</div>
                 <div className="stat-label">Expenses</div>
               </div>
             </div>
@@ -96,7 +96,7 @@ const GroupDashboard = () => {
               <div className="stat-icon">💰</div>
               <div className="stat-info">
                 <div className="stat-number">
-                  ₹{groupData.expenses.reduce((sum, exp) => sum + exp.amount, 0).toFixed(2)}
+                  ₹{groupData.group.total_spent.toFixed(2)}
                 </div>
                 <div className="stat-label">Total Spent</div>
               </div>
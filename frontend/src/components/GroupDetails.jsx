@@ -122,7 +122,7 @@ const GroupDetails = () => {
                     <span className="stat-label">Members</span>
                   </span>
                   <span className="stat">
-                    <span className="stat-number">{groupData?.expenses?.length || 0}</span>
+                    <span className="stat-number">{groupData?.group?.expense_count || 0}</span>
                     <span className="stat-label">Expenses</span>
                   </span>
                 </div>
@@ -21,7 +21,7 @@ const GroupsList = () => {
       try {
         const [ , groupsResponse] = await Promise.all([
           authAPI.getMe(),
-          groupAPI.getMyGroups()
+          groupAPI.getMyGroupsSummary()
         ]);
         setGroups(groupsResponse.data);
       } catch (error) {
@@ -42,7 +42,7 @@ const GroupsList = () => {
 
     try {
       await groupAPI.createGroup(formData);
-      const groupsResponse = await groupAPI.getMyGroups();
+      const groupsResponse = await groupAPI.getMyGroupsSummary();
       setGroups(groupsResponse.data);
       setShowCreateForm(false);
       setFormData({ name: '', description: '' });
@@ -62,7 +62,7 @@ const GroupsList = () => {
       const token = inviteLink.split('/').pop();
       await groupAPI.joinGroup(token);
       // Refresh groups list
-      const groupsResponse = await groupAPI.getMyGroups();
+      const groupsResponse = await groupAPI.getMyGroupsSummary();
       setGroups(groupsResponse.data);
       setShowJoinForm(false);
       setInviteLink('');
@@ -150,6 +150,11 @@ const GroupsList = () => {
               </div>
               <div className="group-meta">
                 <div className="group-time">📊</div>
+                {group.balance !== 0 && (
+                  <div className={`group-balance ${group.balance > 0 ? 'owed' : 'owes'}`}>
+                    {group.balance > 0 ? '+' : '-'}₹{Math.abs(group.balance).toFixed(2)}
+                  </div>
+                )}
               </div>
             </div>
           ))
@@ -8,6 +8,41 @@ const api = axios.create({
   withCredentials: true,
 });
 
+// Access tokens are short lived: on a 401, trade the refresh cookie for a
+// new pair once and replay the request. Concurrent 401s share one refresh.
+let refreshing = null;
+
+api.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const original = error.config;
+    const url = original?.url || '';
+    if (
+      error.response?.status !== 401 ||
+      original._retried ||
+      url.startsWith('/auth/login') ||
+      url.startsWith('/auth/refresh')
+    ) {
+      return Promise.reject(error);
+    }
+    original._retried = true;
+
+    if (!refreshing) {
+      refreshing = api.post('/auth/refresh').finally(() => {
+        refreshing = null;
+      });
+    }
+
+    try {
+      const response = await refreshing;
+      localStorage.setItem('token', response.data.access_token);
+    } catch (refreshError) {
+      return Promise.reject(error);
+    }
+    return api(original);
+  }
+);
+
 export const authAPI = {
   login: async (data) => {
     const formData = new FormData();
@@ -47,6 +82,10 @@ export const groupAPI = {
     return api.get('/groups/my-groups');
   },
 
+  getMyGroupsSummary: async () => {
+    return api.get('/groups/my-groups/summary');
+  },
+
   getGroup: async (groupId) => {
     return api.get(`/groups/${groupId}`);
   },
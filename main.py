@@ -1,15 +1,59 @@
 
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
 import models
-from routers import auth, groups, expenses,chat,admin,settlement,about
+from routers import auth, groups, expenses,chat,admin,settlement,about,metrics
+from services.chat_pipeline import chat_pipeline
+from services.typing_state import typing_tracker
+from services.connection_registry import registry
+from services.loop_monitor import loop_monitor
+from services.outbox import outbox_dispatcher
+from services.chat_archive import chat_archiver
+from services.graceful_shutdown import graceful_shutdown
+from services.password_hasher import password_hasher
+from services.token_revocation import revocations
+from services.janitor import janitor
+from services.group_stats import group_stats_reconciler
+from services.notifications import notifications
 from dotenv import load_dotenv
 import os
 
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    chat_pipeline.start()
+    typing_tracker.start(chat.broadcast)
+    registry.start(chat._send_message)
+    outbox_dispatcher.start(chat.broadcast)
+    chat_archiver.start()
+    revocations.start()
+    janitor.start()
+    group_stats_reconciler.start()
+    notifications.start()
+    graceful_shutdown.start(chat._send_message)
+    yield
+    # turn new sockets away, deliver committed bot messages, then ask
+    # clients to reconnect with jitter before anything below is stopped
+    await graceful_shutdown.drain()
+    await notifications.stop()
+    await group_stats_reconciler.stop()
+    await janitor.stop()
+    await revocations.stop()
+    await chat_archiver.stop()
+    await outbox_dispatcher.stop()
+    await registry.stop()
+    await typing_tracker.stop()
+    # flush chat messages still waiting for their batch
+    await chat_pipeline.stop()
+    await loop_monitor.stop()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 load_dotenv()
 
@@ -37,7 +81,31 @@ app.include_router(expenses.router)
 app.include_router(admin.router)
 app.include_router(settlement.router)
 app.include_router(about.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def root():
-    return {"message": "smart splitter api is running"}
\ No newline at end of file
+    return {"message": "smart splitter api is running"}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    class Server(uvicorn.Server):
+        # uvicorn closes every socket with a bare 1012 before the lifespan
+        # shutdown runs, so drain the chat first while sockets are still open
+        async def shutdown(self, sockets=None):
+            await graceful_shutdown.drain()
+            await super().shutdown(sockets)
+
+    # permessage-deflate is negotiated per socket by the websockets protocol;
+    # it costs a compressor per connection, so it can be switched off
+    config = uvicorn.Config(
+        app,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        ws="websockets",
+        ws_per_message_deflate=os.getenv("CHAT_WS_DEFLATE", "true").lower() == "true",
+        timeout_graceful_shutdown=int(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "30")),
+    )
+    Server(config).run()
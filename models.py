@@ -1,5 +1,5 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Table, Float,Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Table, Float,Boolean, JSON, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -42,13 +42,36 @@ class User(Base):
     expenses_paid = relationship("Expense", back_populates="payer")
     
     
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    # only the sha256 of the token is stored; a login starts a family and
+    # every refresh rotates to a new token in the same family
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String, unique=True, index=True, nullable=False)
+    family = Column(String, index=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked = Column(Boolean, default=False)
+    rotated_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    # access tokens logged out before they expired, by jti
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    
 class OTPVerification(Base):
     __tablename__ = "otp_verifications"
     
     id = Column(Integer, primary_key=True)
     phone = Column(String, nullable=False, index=True)
     otp = Column(String, nullable=False)
-    expires_at= Column(DateTime)
+    expires_at= Column(DateTime, index=True)
     verified = Column(Boolean, default=False)
     
     
@@ -61,6 +84,11 @@ class Group(Base):
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # kept up to date by services/group_stats.py in the writing transactions
+    member_count = Column(Integer, nullable=False, default=0, server_default="0")
+    expense_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_spent = Column(Float, nullable=False, default=0, server_default="0")
+    last_activity_at = Column(DateTime, nullable=True)
 
     
     members = relationship("User", secondary=group_members, back_populates="groups")
@@ -84,6 +112,11 @@ class Expense(Base):
     payer = relationship("User", back_populates="expenses_paid")
     group = relationship("Group", back_populates="expenses")
     involved_users = relationship("User", secondary=expense_members)
+
+    __table_args__ = (
+        # dashboard pages walk a group's expenses newest first by id
+        Index("ix_expenses_group_id_id", "group_id", "id"),
+    )
     
     
     
@@ -95,6 +128,8 @@ class ChatMessage(Base):
     sender_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     sender_type = Column(String, default="user")  # 'user' or 'bot'
     content = Column(String, nullable=False)
+    kind = Column(String, nullable=True)  # bot messages: the bot_events kind, kept for replays
+    data = Column(JSON, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     group = relationship("Group", back_populates="messages")
@@ -102,6 +137,43 @@ class ChatMessage(Base):
     
     sender = relationship("User", foreign_keys=[sender_id])
     
+    __table_args__ = (
+        # every history read is "this group, by id"
+        Index("ix_chat_messages_group_id_id", "group_id", "id"),
+        # ...or by send time, for resumes and the ring warm-up
+        Index("ix_chat_messages_group_id_timestamp", "group_id", "timestamp"),
+    )
+
+
+class ChatArchive(Base):
+    __tablename__ = "chat_archive"
+    
+    # cold chat history: one zlib-compressed JSON blob per group, month and archival run
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, ForeignKey("groups.id", ondelete="CASCADE"), nullable=False)
+    month = Column(String, nullable=False)  # 'YYYY-MM' of the messages inside
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False)
+    blob = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_chat_archive_group_id_last_id", "group_id", "last_id"),
+    )
+    
+
+class ChatOutbox(Base):
+    __tablename__ = "chat_outbox"
+    
+    # bot messages written in the caller's transaction, delivered by the dispatcher
+    id = Column(Integer, primary_key=True)
+    group_id = Column(Integer, ForeignKey("groups.id", ondelete="CASCADE"))
+    content = Column(String, nullable=False)
+    kind = Column(String, nullable=True)  # bot_events kind, e.g. 'expense_added'
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
 
 class GroupInvite(Base):
     __tablename__ = "group_invites"
@@ -109,7 +181,7 @@ class GroupInvite(Base):
     id = Column(Integer, primary_key=True)
     group_id = Column(Integer, ForeignKey("groups.id", ondelete="CASCADE"))
     token = Column(String, unique=True, index=True)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
     created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     used = Column(Boolean, default=False)
     
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
 from .auth import get_current_user, get_db
+from .chat import close_group, remove_member
+from .membership import require_member, check_membership, Membership
+from services.membership_cache import membership_cache
 from models import Settlement, User, Group, group_members
-from services.chat_services import broadcast_bot_message
+from services.chat_services import queue_bot_event
+from services import bot_events
+from services import group_stats
 
 router = APIRouter(
     prefix="/admin",
@@ -17,7 +23,10 @@ def undo_settlement(
     user: User = Depends(get_current_user)
 ):
     
-    settlement = db.query(Settlement).filter(
+    settlement = db.query(Settlement).options(
+        joinedload(Settlement.payer),
+        joinedload(Settlement.receiver)
+    ).filter(
         Settlement.id == settlement_id
     ).first()
 
@@ -26,31 +35,18 @@ def undo_settlement(
     
     
     # ADMIN CHECK
-    role = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id == settlement.group_id)
-        .where(group_members.c.user_id == user.id)
-    ).first()
-    
-    
-    if role.role != "admin":
-        raise HTTPException(status_code=403, detail="only admins can undo settlements")
+    check_membership(settlement.group_id, user.id, "admin", "only admins can undo settlements")
 
     
 
-    group_id = settlement.group_id
-    amount = settlement.amount
-    payer_name = settlement.payer.name
-    receiver_name = settlement.receiver.name
-
     settlement.is_paid = False
     settlement.settled_at = None
-    db.commit()
-    db.refresh(settlement)
 
     # BOT MESSAGE
-    msg = f"Settlement undone: {payer_name} → {receiver_name} ₹{amount}"
-    broadcast_bot_message(group_id, msg)
+    queue_bot_event(db, settlement.group_id, bot_events.settlement_undone(
+        settlement, settlement.payer, settlement.receiver
+    ))
+    db.commit()
 
     return {"message": "settlement undone successfully"}
 
@@ -59,8 +55,9 @@ def undo_settlement(
 
 def delete_group(
     group_id: int,
+    background_tasks: BackgroundTasks,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member("admin", "only admins can delete the group"))
 ):
     
     group = db.query(Group).filter(Group.id == group_id).first()
@@ -68,18 +65,11 @@ def delete_group(
     if not group:
         raise HTTPException(status_code=404, detail="Group not found")
     
-    
-    role = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id == group_id)
-        .where(group_members.c.user_id == current_user.id)
-    ).first()
-    
-    if role.role != "admin":
-        raise HTTPException(status_code=403, detail="only admins can delete the group")
-    
     db.delete(group)
     db.commit() 
+    membership_cache.invalidate_group(group_id)
+    # close its chat sockets and streams on the event loop
+    background_tasks.add_task(close_group, group_id)
     return {"message": "group deleted successfully"}
 
 
@@ -88,47 +78,36 @@ def delete_group(
 def delete_member(
     group_id: int,
     user_id: int,
+    background_tasks: BackgroundTasks,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    current_user: User=Depends(get_current_user),
+    membership: Membership=Depends(require_member("admin", "not authorized to remove user"))
 ):
     
-    member = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id == group_id)
-        .where(group_members.c.user_id == current_user.id)
-    ).first()
-    
-    if not member:
-        raise HTTPException(status_code=404, detail="not a group member")
-    
-    if member.role != "admin":
-        raise HTTPException(status_code=403, detail="not authorized to remove user")
-    
-    target_member = db.execute(
-        group_members.select()
+    # membership and user info in one go, needed for the bot message
+    target_user = db.execute(
+        select(User)
+        .join(group_members, group_members.c.user_id == User.id)
         .where(group_members.c.group_id == group_id)
         .where(group_members.c.user_id == user_id)
-    ).first()
+    ).scalars().first()
     
     
     
-    if not target_member:
+    if not target_user:
         raise HTTPException(status_code=404, detail="user not found in group")
     
-    # Get user info before deletion
-    target_user = db.query(User).filter(User.id == user_id).first()
-    
     db.execute(
         group_members.delete()
         .where(group_members.c.group_id == group_id)
         .where(group_members.c.user_id == user_id)
     )
+    group_stats.bump(db, group_id, members=-1)
     
+    queue_bot_event(db, group_id, bot_events.member_removed(target_user, current_user))
     db.commit()
-    
-    msg = f"{target_user.name} was removed from the group by {current_user.name}"
-    
-    broadcast_bot_message(group_id, msg)
+    membership_cache.invalidate(group_id, user_id)
+    background_tasks.add_task(remove_member, group_id, user_id)
     
     
     return {"message": "user removed from group"}
@@ -1,13 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends, Response, Request, status
 from sqlalchemy.orm import Session 
 from database import SessionLocal
-from models import User, OTPVerification
+from models import User, OTPVerification, RefreshToken
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from Schemas import Token, UserCreate
 import random
+import secrets
+import hashlib
+import uuid
+from services.auth_cache import auth_cache
+from services.password_hasher import password_hasher, pwd_context
+from services.token_revocation import revocations
+from services.rate_limiter import rate_limiter, client_ip, parse_limit
+from services.notifications import notifications, Notification
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import os
 
@@ -18,13 +26,23 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 30
+# two tabs refreshing with the same cookie: the loser just retries
+REFRESH_REUSE_GRACE_SECONDS = 10
+
+# "requests/seconds", checked before any DB or bcrypt work
+OTP_LIMIT_PER_PHONE = parse_limit(os.getenv("RATE_LIMIT_OTP_PHONE", "3/600"))
+OTP_LIMIT_PER_IP = parse_limit(os.getenv("RATE_LIMIT_OTP_IP", "20/3600"))
+LOGIN_LIMIT_PER_USER = parse_limit(os.getenv("RATE_LIMIT_LOGIN_USER", "10/300"))
+LOGIN_LIMIT_PER_IP = parse_limit(os.getenv("RATE_LIMIT_LOGIN_IP", "50/300"))
+REGISTER_LIMIT_PER_PHONE = parse_limit(os.getenv("RATE_LIMIT_REGISTER_PHONE", "5/600"))
+REGISTER_LIMIT_PER_IP = parse_limit(os.getenv("RATE_LIMIT_REGISTER_IP", "20/3600"))
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 def get_db():
@@ -44,10 +62,61 @@ def verify_password(plan, hashed):
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expires = datetime.utcnow() + (expires_delta or timedelta(minutes=ACESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expires})
+    to_encode.update({"exp": expires, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-@router.post("/register/send-otp")
+def _hash_refresh_token(token: str):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(db: Session, user_id: int, family: str | None = None):
+    # the caller commits; only the hash is stored
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_refresh_token(token),
+        family=family or uuid.uuid4().hex,
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+def set_auth_cookies(response: Response, access_token: str, refresh_token: str):
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        samesite="none",   # VERY IMPORTANT
+        secure=True        # VERY IMPORTANT (must be True with samesite none)
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        max_age=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600,
+        path="/auth",      # only sent to refresh and logout
+        httponly=True,
+        samesite="none",
+        secure=True
+    )
+
+
+async def limit_send_otp(request: Request, phone: str):
+    await rate_limiter.check("otp_phone", phone, *OTP_LIMIT_PER_PHONE)
+    await rate_limiter.check("otp_ip", client_ip(request), *OTP_LIMIT_PER_IP)
+
+
+async def limit_register(request: Request, user: UserCreate):
+    # per phone too, so the 6 digit OTP can't be guessed
+    await rate_limiter.check("register_phone", user.phone, *REGISTER_LIMIT_PER_PHONE)
+    await rate_limiter.check("register_ip", client_ip(request), *REGISTER_LIMIT_PER_IP)
+
+
+async def limit_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    await rate_limiter.check("login_user", form_data.username, *LOGIN_LIMIT_PER_USER)
+    await rate_limiter.check("login_ip", client_ip(request), *LOGIN_LIMIT_PER_IP)
+
+
+@router.post("/register/send-otp", dependencies=[Depends(limit_send_otp)])
 def send_otp(phone: str, db: Session=Depends(get_db)):
     
     existing = db.query(User).filter(User.phone==phone).first()
@@ -71,73 +140,93 @@ def send_otp(phone: str, db: Session=Depends(get_db)):
     db.add(record)
     db.commit()
     
-    print(f"OTP for {phone}: {otp}")
-    # For testing - remove in production
-    return {"message": "OTP sent successfully", "otp": otp}
+    # delivered in the background, the provider's latency isn't ours
+    notifications.enqueue(Notification(phone, f"Your Smart Splitter OTP is {otp}. It expires in 10 minutes.", "otp"))
+    
+    # stand-in providers deliver nowhere a user can read, so the app shows it
+    if notifications.echoes_otp:
+        return {"message": "OTP sent successfully", "otp": otp}
+    return {"message": "OTP sent successfully"}
     
 
-@router.post("/register/verify")
-def register(
+@router.post("/register/verify", dependencies=[Depends(limit_register)])
+async def register(
     user: UserCreate,
     otp: str, 
     db: Session= Depends(get_db)
 ):
-    record = db.query(OTPVerification).filter(
-        OTPVerification.phone == user.phone,
-        OTPVerification.verified == False
-    ).order_by(OTPVerification.id.desc()).first()
-    
-    if not record:
-        raise HTTPException(status_code=400, detail="OTP not found")
-    
-    if record.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=400, detail="OTP expired")
-    
-    if record.otp != otp:
-        raise HTTPException(status_code=400, detail="invalid OTP")
-    
-    existing = db.query(User).filter(User.phone==user.phone).first()
-    
-    if existing:
-        raise HTTPException(status_code=400, detail="phone number already exists")
-    
-    record.verified = True
+    def check_otp():
+        record = db.query(OTPVerification).filter(
+            OTPVerification.phone == user.phone,
+            OTPVerification.verified == False
+        ).order_by(OTPVerification.id.desc()).first()
+        
+        if not record:
+            raise HTTPException(status_code=400, detail="OTP not found")
+        
+        if record.expires_at < datetime.utcnow():
+            raise HTTPException(status_code=400, detail="OTP expired")
+        
+        if record.otp != otp:
+            raise HTTPException(status_code=400, detail="invalid OTP")
+        
+        existing = db.query(User).filter(User.phone==user.phone).first()
+        
+        if existing:
+            raise HTTPException(status_code=400, detail="phone number already exists")
+        
+        return record
     
+    record = await run_in_threadpool(check_otp)
     
-    new_user = User(
-        name = user.name,
-        phone = user.phone,
-        password_hash = hash_password(user.password),
-        email = user.email
-    )
-    db.add(new_user)
+    # bcrypt runs on the hasher pool, not on a request thread
+    password_hash = await password_hasher.hash(user.password)
     
-    db.delete(record)
+    def save():
+        record.verified = True
+        
+        new_user = User(
+            name = user.name,
+            phone = user.phone,
+            password_hash = password_hash,
+            email = user.email
+        )
+        db.add(new_user)
+        
+        db.delete(record)
+        
+        db.commit()
+        db.refresh(new_user)
     
-    db.commit()
-    db.refresh(new_user)
+    await run_in_threadpool(save)
     
     return {"message": "user registered successfully"}
 
-@router.post("/login")
-def Login(
+@router.post("/login", dependencies=[Depends(limit_login)])
+async def Login(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session=Depends(get_db)
 ):
-    user = db.query(User).filter(User.phone == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.phone == form_data.username).first()
+    )
+    if not user:
         raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="invalid credentials")
     
-    token = create_access_token({"sub": str(user.id)})
+    valid, new_hash = await password_hasher.verify(form_data.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code= status.HTTP_401_UNAUTHORIZED, detail="invalid credentials")
     
-    response.set_cookie(
-        key="access_token",
-        value=token,
-        httponly=True,
-        samesite="none",   # VERY IMPORTANT
-        secure=True        # VERY IMPORTANT (must be True with samesite none)
-    )
+    # stored with an older work factor: upgrade it now that we know the password
+    if new_hash:
+        user.password_hash = new_hash
+    
+    refresh_token = issue_refresh_token(db, user.id)
+    await run_in_threadpool(db.commit)
+    
+    token = create_access_token({"sub": str(user.id)})
+    set_auth_cookies(response, token, refresh_token)
     
     return {
         "message": "login successfully",
@@ -151,6 +240,16 @@ def get_current_user(request: Request, db: Session=Depends(get_db)):
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="not authenticated")
     
+    # cached principal: no decode and no users query, merge attaches it
+    # to this session without a SELECT so routes can use it as before
+    cached = auth_cache.get(token)
+    if cached is not None:
+        user, jti = cached
+        if revocations.is_revoked(jti, db):
+            auth_cache.invalidate_token(token)
+            raise HTTPException(status_code=401, detail="token revoked")
+        return db.merge(user, load=False)
+    
     try: 
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
@@ -160,11 +259,15 @@ def get_current_user(request: Request, db: Session=Depends(get_db)):
     except JWTError:
         raise HTTPException(status_code=401, detail="invalid token")
     
+    if revocations.is_revoked(payload.get("jti"), db):
+        raise HTTPException(status_code=401, detail="token revoked")
+    
     user = db.query(User).filter(User.id == int(user_id)).first()
     
     if not user:
         raise HTTPException(status_code=401, detail="user not found")
     
+    auth_cache.put(token, user, payload.get("exp"), payload.get("jti"))
     
     return user
 
@@ -180,14 +283,66 @@ def read_me(current_user=Depends(get_current_user)):
     }
     
     
-@router.post("/logout")
-def Logout(response: Response):
-    response.delete_cookie("access_token")
-    return {"message":"Logged out"}
+@router.post("/refresh")
+def refresh(request: Request, response: Response, db: Session=Depends(get_db)):
+    token = request.cookies.get("refresh_token")
+    if not token:
+        raise HTTPException(status_code=401, detail="not authenticated")
     
+    # one lookup on the unique token_hash index, no password hashing
+    record = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_refresh_token(token)).first()
+    if not record:
+        raise HTTPException(status_code=401, detail="invalid refresh token")
     
-
+    now = datetime.utcnow()
     
-
+    if record.revoked:
+        rotated_at = record.rotated_at
+        if rotated_at and (now - rotated_at).total_seconds() < REFRESH_REUSE_GRACE_SECONDS:
+            raise HTTPException(status_code=401, detail="refresh token already rotated")
+        # an old token came back: assume it was stolen and end the whole session
+        db.query(RefreshToken).filter(RefreshToken.family == record.family).update({"revoked": True})
+        db.commit()
+        raise HTTPException(status_code=401, detail="refresh token reused")
     
-
+    if record.expires_at < now:
+        raise HTTPException(status_code=401, detail="refresh token expired")
+    
+    record.revoked = True
+    record.rotated_at = now
+    new_refresh_token = issue_refresh_token(db, record.user_id, record.family)
+    db.commit()
+    
+    access_token = create_access_token({"sub": str(record.user_id)})
+    set_auth_cookies(response, access_token, new_refresh_token)
+    
+    return {
+        "message": "token refreshed",
+        "access_token": access_token,
+        "token_type": "bearer"
+    }
+    
+    
+@router.post("/logout")
+def Logout(request: Request, response: Response, db: Session=Depends(get_db)):
+    access_token = request.cookies.get("access_token")
+    if access_token:
+        try:
+            payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("jti"):
+                revocations.revoke(db, payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+        except JWTError:
+            pass
+        auth_cache.invalidate_token(access_token)
+    
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        record = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_refresh_token(refresh_token)).first()
+        if record:
+            db.query(RefreshToken).filter(RefreshToken.family == record.family).update({"revoked": True})
+    
+    db.commit()
+    
+    response.delete_cookie("access_token")
+    response.delete_cookie("refresh_token", path="/auth", httponly=True, samesite="none", secure=True)
+    return {"message":"Logged out"}
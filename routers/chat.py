@@ -1,15 +1,26 @@
 # chat.py
-from fastapi import APIRouter, WebSocket, Depends, HTTPException, WebSocketDisconnect
+from fastapi import APIRouter, WebSocket, Depends, HTTPException, WebSocketDisconnect, Request
+from fastapi.responses import StreamingResponse, Response
 from starlette import status
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models import ChatMessage, User, expense_members, chat_read_receipts
-from datetime import datetime
+from models import User, expense_members, chat_read_receipts, group_members
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
 import asyncio
-import json
-from .auth import get_current_user, ALGORITHM
+from collections import deque
+from .auth import get_current_user, ALGORITHM, get_db as get_auth_db
+from .membership import require_member, check_membership, Membership
 from fastapi import Query
 from jose import jwt, JWTError
+from services.chat_pipeline import chat_pipeline
+from services.chat_history import chat_history
+from services.typing_state import typing_tracker
+from services.connection_registry import registry, ChatConnection
+from services.chat_codec import negotiate, encode, decode, FrameCache
+from services.event_stream import group_streams, format_sse, STREAM_KEEPALIVE_SECONDS
+from services.token_revocation import revocations
+from services.graceful_shutdown import graceful_shutdown, reconnect_frame, CLOSE_SERVICE_RESTART
 from dotenv import load_dotenv
 import os
 
@@ -18,14 +29,15 @@ load_dotenv()
 
 
 SECRET_KEY = os.getenv("SECRET_KEY")
+HISTORY_PAGE_SIZE = 50
+# ids an SSE stream remembers, so replay and live feed never repeat a message
+SSE_DEDUP_WINDOW = 1000
 
 router = APIRouter(
     prefix="/chat",
     tags=["chat"]
 )
 
-active_connections: dict[int, list[WebSocket]] = {}
-
 def get_db():
     db = SessionLocal()
     try:
@@ -34,165 +46,400 @@ def get_db():
         db.close()
 
 
-async def _send_message(ws: WebSocket, payload: dict):
+async def _send_frame(conn: ChatConnection, frame):
     try:
-        await ws.send_text(json.dumps(payload))
-    except:
-        pass
-    
+        if isinstance(frame, bytes):
+            await conn.websocket.send_bytes(frame)
+        else:
+            await conn.websocket.send_text(frame)
+    except Exception:
+        # the socket is gone: stop fanning out to it and close it, so the
+        # handler's receive loop ends instead of idling outside the reaper
+        await registry.drop(conn)
+
+
+async def _send_message(conn: ChatConnection, payload: dict):
+    await _send_frame(conn, encode(conn.codec, payload))
+
+
+async def _receive(conn: ChatConnection) -> dict:
+    message = await conn.websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    conn.touch()
+    return decode(message)
+
 async def broadcast(group_id: int, payload: dict):
-    if group_id not in active_connections:
+    if payload.get("event") in ("message", "bot_message"):
+        chat_history.record(group_id, payload)
+
+    # tag every event so sockets subscribed to several groups can route it
+    payload = {**payload, "group_id": group_id}
+    group_streams.publish(group_id, payload)
+
+    connections = registry.group(group_id)
+    if not connections:
         return
 
-    for ws in active_connections[group_id]:
-        asyncio.create_task(_send_message(ws, payload))
+    # serialize once per codec rather than once per socket
+    frames = FrameCache(payload)
 
+    for conn in connections:
+        asyncio.create_task(_send_frame(conn, frames.get(conn.codec)))
 
 
+async def close_group(group_id: int):
+    # after a group is deleted: nothing more can be written to it
+    await registry.drop_group(group_id)
+    group_streams.close_group(group_id)
+    chat_history.drop_group(group_id)
 
 
+async def remove_member(group_id: int, user_id: int):
+    # after a user leaves or is removed: their open sockets stop getting the group
+    typing_tracker.stopped(group_id, user_id)
+    await registry.drop_member(group_id, user_id)
 
-@router.websocket("/ws/{group_id}")
-async def websocket_endpoint(websocket: WebSocket, group_id: int, token: str = Query(None)):
-    
+
+def _forget_if_lost(group_id: int, message_id: int):
+    def callback(persisted):
+        if not persisted.cancelled() and persisted.exception() is not None:
+            chat_history.forget(group_id, message_id)
+    return callback
+
+
+async def _reject_while_draining(websocket: WebSocket) -> bool:
+    # a worker on its way out sends new sockets elsewhere, with jitter
+    if not graceful_shutdown.draining:
+        return False
+    await websocket.accept()
+    await websocket.send_json(reconnect_frame())
+    await websocket.close(code=CLOSE_SERVICE_RESTART)
+    return True
+
+
+def _decode_ws_token(token: str | None):
     if not token:
+        return None, None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None, None
+    user_id = payload.get("sub")
+    return int(user_id) if user_id else None, payload.get("jti")
+
+
+def _load_identity(user_id: int):
+    # name and memberships in one query, done once per connection
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(User.name, group_members.c.group_id)
+            .outerjoin(group_members, group_members.c.user_id == User.id)
+            .where(User.id == user_id)
+        ).all()
+    finally:
+        db.close()
+
+    if not rows:
+        return None, set()
+    return rows[0].name, {row.group_id for row in rows if row.group_id is not None}
+
+
+async def _authenticate_socket(websocket: WebSocket, token: str | None):
+    """
+    (user_id, user_name, member_of) for the token's user, or None once the
+    socket has been closed: 1008 for a bad, revoked or orphaned token, the
+    restart code while draining.
+    """
+    if await _reject_while_draining(websocket):
+        return None
+
+    user_id, jti = _decode_ws_token(token)
+    if user_id is None:
         await websocket.close(code=1008)
+        return None
+
+    # logged out tokens; the filter answers in memory unless it's a hit
+    if revocations.might_be_revoked(jti) and await run_in_threadpool(revocations.is_revoked, jti):
+        await websocket.close(code=1008)
+        return None
+
+    user_name, member_of = await run_in_threadpool(_load_identity, user_id)
+    if user_name is None:
+        await websocket.close(code=1008)
+        return None
+    return user_id, user_name, member_of
+
+
+async def _ack_when_persisted(conn: ChatConnection, group_id: int, message_id: int, client_id, persisted):
+    try:
+        await persisted
+    except Exception:
+        await _send_message(conn, {"event": "nack", "group_id": group_id, "id": message_id, "client_id": client_id})
         return
-    
+    await _send_message(conn, {"event": "ack", "group_id": group_id, "id": message_id, "client_id": client_id})
+
+
+async def _resume(conn: ChatConnection, group_id: int, last_id):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            await websocket.close(code=1008)
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        await _send_message(conn, {"event": "error", "detail": "invalid last_id", "group_id": group_id})
+        return
+
+    missed, source = await run_in_threadpool(chat_history.missed, group_id, last_id)
+
+    for payload in missed:
+        await _send_message(conn, {**payload, "group_id": group_id})
+
+    await _send_message(conn, {
+        "event": "resumed",
+        "group_id": group_id,
+        "count": len(missed),
+        "source": source
+    })
+
+
+async def _handle_event(conn: ChatConnection, group_id: int, data: dict):
+    event = data.get("event")
+
+    if event == "message":
+        content = data.get("content")
+        if not content:
             return
-        
-    except JWTError:
+
+        # sender comes from the identity cached at accept, never the payload;
+        # the row is written by the pipeline in the next micro-batch
+        row, persisted = await chat_pipeline.submit(group_id, conn.user_id, content)
+
+        payload = {
+            "event": "message",
+            "message": {
+                "id": row["id"],
+                "sender_id": conn.user_id,
+                "sender_name": conn.user_name,
+                "content": row["content"],
+                "timestamp": row["timestamp"].isoformat()
+            }
+        }
+
+        typing_tracker.stopped(group_id, conn.user_id)
+        await broadcast(group_id, payload)
+        # a row the DB rejected shouldn't be served as history later
+        persisted.add_done_callback(_forget_if_lost(group_id, row["id"]))
+
+        if data.get("ack"):
+            asyncio.create_task(_ack_when_persisted(conn, group_id, row["id"], data.get("client_id"), persisted))
+
+
+    elif event == "resume":
+        await _resume(conn, group_id, data.get("last_id"))
+
+    elif event == "typing":
+        # the name comes from the authenticated socket, not the payload
+        typing_tracker.typing(group_id, conn.user_id, conn.user_name)
+
+    elif event == "stop_typing":
+        typing_tracker.stopped(group_id, conn.user_id)
+
+
+def _disconnect(conn: ChatConnection):
+    for group_id in conn.groups:
+        typing_tracker.stopped(group_id, conn.user_id)
+    registry.unregister(conn)
+
+
+
+
+
+
+@router.websocket("/ws/{group_id}")
+async def websocket_endpoint(websocket: WebSocket, group_id: int, token: str = Query(None), last_id: int = Query(None)):
+
+    identity = await _authenticate_socket(websocket, token)
+    if identity is None:
+        return
+    user_id, user_name, member_of = identity
+    if group_id not in member_of:
         await websocket.close(code=1008)
         return
-    
 
-    await websocket.accept()
-    active_connections.setdefault(group_id, []).append(websocket)
+    codec, subprotocol = negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    conn = registry.register(websocket, user_id, user_name, codec)
+    registry.subscribe(conn, group_id)
 
     try:
+        # reconnecting clients pass the last message id they saw
+        if last_id is not None:
+            await _resume(conn, group_id, last_id)
+
         while True:
-            data = await websocket.receive_text()
-            data = json.loads(data)
-            
-            event = data.get("event")
-            
-            if event == "message":
-                user_id = data.get("user_id")
-                content = data.get("content")
-          
-                db = SessionLocal()
-            
-                user = db.query(User).filter(User.id == user_id).first()
-            
-                if not user:
-                    db.close()
-                    continue
-                
-                
-                chat_msg = ChatMessage(
-                    group_id=group_id,
-                    sender_id=user.id,
-                    sender_type="user",
-                    content=content,
-                    timestamp=datetime.utcnow()
-                )
-                db.add(chat_msg)
-                db.commit()
-                db.refresh(chat_msg)
-                
-                # Build payload BEFORE closing DB (while object is still attached)
-                payload = {
-                    "event": "message",
-                    "message": {
-                        "id": chat_msg.id,
-                        "sender_id": user.id,
-                        "sender_name": user.name,
-                        "content": chat_msg.content,
-                        "timestamp": chat_msg.timestamp.isoformat()
-                    }
-                }
-                
-                db.close()
-
-                await broadcast(group_id, payload)
-            
-            
-            elif event == "typing":
-                user_name = data.get("user_name")
-                await broadcast_typing(group_id, user_name)
-                
+            data = await _receive(conn)
+
+            if data.get("event") == "pong":
+                continue
+
+            await _handle_event(conn, group_id, data)
+
     except WebSocketDisconnect:
-        if group_id in active_connections and websocket in active_connections[group_id]:
-            active_connections[group_id].remove(websocket)
         print(f"Client disconnected from group {group_id}")
     except Exception as e:
         print(f"WebSocket error in group {group_id}: {str(e)}")
-        if group_id in active_connections and websocket in active_connections[group_id]:
-            active_connections[group_id].remove(websocket)
-
-    
-    
-async def broadcast_typing(group_id: int, user_name: str):
-    payload = {
-        "event": "typing",
-        "user": user_name
-    }
-    await broadcast(group_id, payload)
-    
-    
-@router.get("/{group_id}/messages")
-def get_chat_messages(
+    finally:
+        _disconnect(conn)
+
+
+# one socket per user, multiplexing every group the user belongs to
+# (or the comma separated subset passed in `groups`); events carry group_id
+@router.websocket("/ws")
+async def user_websocket_endpoint(websocket: WebSocket, token: str = Query(None), groups: str = Query(None)):
+
+    identity = await _authenticate_socket(websocket, token)
+    if identity is None:
+        return
+    user_id, user_name, member_of = identity
+
+    if groups:
+        try:
+            requested = {int(g) for g in groups.split(",") if g.strip()}
+        except ValueError:
+            await websocket.close(code=1008)
+            return
+        subscribed = requested & member_of
+    else:
+        subscribed = set(member_of)
+
+    codec, subprotocol = negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    conn = registry.register(websocket, user_id, user_name, codec)
+    for group_id in subscribed:
+        registry.subscribe(conn, group_id)
+
+    await _send_message(conn, {"event": "subscribed", "groups": sorted(conn.groups)})
+
+    try:
+        while True:
+            data = await _receive(conn)
+
+            event = data.get("event")
+            group_id = data.get("group_id")
+
+            if event == "pong":
+                continue
+
+            if event == "subscribe":
+                # membership may have changed since connect (joined a group)
+                _, member_of = await run_in_threadpool(_load_identity, user_id)
+                for gid in data.get("groups", []):
+                    if gid in member_of:
+                        registry.subscribe(conn, gid)
+                await _send_message(conn, {"event": "subscribed", "groups": sorted(conn.groups)})
+                continue
+
+            if event == "unsubscribe":
+                for gid in data.get("groups", []):
+                    typing_tracker.stopped(gid, user_id)
+                    registry.unsubscribe(conn, gid)
+                await _send_message(conn, {"event": "subscribed", "groups": sorted(conn.groups)})
+                continue
+
+            if group_id not in conn.groups:
+                await _send_message(conn, {"event": "error", "detail": "not subscribed to group", "group_id": group_id})
+                continue
+
+            await _handle_event(conn, group_id, data)
+
+    except WebSocketDisconnect:
+        print(f"Client {user_id} disconnected from groups {sorted(conn.groups)}")
+    except Exception as e:
+        print(f"WebSocket error for user {user_id}: {str(e)}")
+    finally:
+        _disconnect(conn)
+
+
+
+# Server-Sent Events alternative to the socket for clients that can't keep
+# one open: chat, expense, settlement and membership events of one group.
+# Reconnects resume from Last-Event-ID (the chat message id).
+@router.get("/{group_id}/events")
+async def group_events(
     group_id: int,
+    request: Request,
+    last_event_id: int = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    # the session get_current_user ran on
+    db: Session = Depends(get_auth_db)
 ):
-    from models import group_members
+    await run_in_threadpool(check_membership, group_id, current_user.id, None, None, request)
+    # get_db only closes it after the response ends; give the connection
+    # back now instead of holding it for the life of the stream
+    await run_in_threadpool(db.close)
 
-    # Verify user is in the group
-    member = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id == group_id)
-        .where(group_members.c.user_id == current_user.id)
-    ).first()
+    if graceful_shutdown.draining:
+        retry_after = reconnect_frame()["retry_after_ms"] // 1000 + 1
+        raise HTTPException(status_code=503, detail="Server restarting", headers={"Retry-After": str(retry_after)})
+
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    try:
+        resume_from = int(resume_from) if resume_from is not None else None
+    except ValueError:
+        resume_from = None
+
+    async def stream():
+        # subscribe first so nothing published during the replay is lost
+        queue = group_streams.subscribe(group_id)
+        # ids aren't broadcast in order (bot ids are taken before the outbox
+        # commit), so only exact repeats of what this stream sent are skipped
+        sent_ids = deque(maxlen=SSE_DEDUP_WINDOW)
+        try:
+            yield "retry: 3000\n\n"
+
+            if resume_from is not None:
+                missed, _ = await run_in_threadpool(chat_history.missed, group_id, resume_from)
+                for payload in missed:
+                    sent_ids.append(payload["message"]["id"])
+                    yield format_sse({**payload, "group_id": group_id})
+
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
 
-    if not member:
-        raise HTTPException(status_code=403, detail="Not a group member")
+                if payload is None:
+                    if graceful_shutdown.draining:
+                        # spread the EventSource reconnects like the sockets'
+                        yield f"retry: {reconnect_frame()['retry_after_ms']}\n\n"
+                    break
 
-    # Get last 50 messages
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.group_id == group_id)
-        .order_by(ChatMessage.timestamp.asc())
-        .limit(50)
-        .all()
+                message_id = payload["message"]["id"]
+                if message_id in sent_ids:
+                    continue
+                sent_ids.append(message_id)
+                yield format_sse(payload)
+        finally:
+            group_streams.unsubscribe(group_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-    result = []
 
-    for msg in messages:
-        if msg.sender_type == "bot":
-            result.append({
-                "id": msg.id,
-                "content": msg.content,
-                "timestamp": msg.timestamp.isoformat(),
-                "type": "bot"
-            })
-        else:
-            result.append({
-                "id": msg.id,
-                "content": msg.content,
-                "sender_id": msg.sender_id,
-                "sender_name": msg.sender.name if msg.sender else "Unknown",
-                "timestamp": msg.timestamp.isoformat(),
-                "type": "user"
-            })
-
-    return result
+@router.get("/{group_id}/messages")
+def get_chat_messages(
+    group_id: int,
+    membership: Membership = Depends(require_member())
+):
+    # last 50 messages, oldest first, already serialized in the ring buffer
+    body = chat_history.recent_json(group_id, HISTORY_PAGE_SIZE)
+    return Response(content=body, media_type="application/json")
 
 
 
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException,Depends,Request
+from fastapi import APIRouter,Depends,Request
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from zoneinfo import ZoneInfo
 from database import SessionLocal
-from models import Group,Expense,User,expense_members,group_members, Settlement
+from models import Expense,User,expense_members, Settlement
 from .auth import get_current_user 
+from .membership import require_member, Membership
 from datetime import datetime
 from Schemas import ExpenseCreate
-from services.chat_services import broadcast_bot_message
+from services.chat_services import queue_bot_event
+from services import bot_events
+from services import group_stats
 
 
 router = APIRouter(
@@ -22,29 +25,14 @@ def get_db():
     finally:
         db.close()
         
-from fastapi import BackgroundTasks
-
 @router.post("/{group_id}/add")
 def add_expense(
     group_id: int,
     data: ExpenseCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    membership: Membership = Depends(require_member())
 ):
-    group = db.query(Group).filter(Group.id == group_id).first()
-    if not group:
-        raise HTTPException(status_code=404, detail="group not found")
-
-    member = db.execute(
-        select(group_members)
-        .where(group_members.c.group_id == group_id)
-        .where(group_members.c.user_id == current_user.id)
-    ).first()
-
-    if not member:
-        raise HTTPException(status_code=400, detail="user not belong to the group")
-
     # Create expense
     expense = Expense(
         group_id=group_id,
@@ -54,8 +42,7 @@ def add_expense(
         date=datetime.now(ZoneInfo("Asia/Kolkata"))
     )
     db.add(expense)
-    db.commit()
-    db.refresh(expense)
+    db.flush()
 
     # Add involved users
     involved = set(data.involved_user_ids)
@@ -68,23 +55,14 @@ def add_expense(
                 user_id=user_id
             )
         )
-    db.commit()
 
-    names = db.query(User).filter(User.id.in_(involved)).all()
-    name_list = ", ".join(u.name for u in names)
+    involved_users = db.query(User).filter(User.id.in_(involved)).all()
 
-    bot_msg = (
-        f"💸 {current_user.name} added ₹{expense.amount} "
-        f"for {expense.note or 'expense'}\n"
-        f"👥 Split between: {name_list}"
-    )
+    group_stats.bump(db, group_id, expenses=1, spent=data.amount)
 
-    # ✅ SAFE: fire-and-forget
-    background_tasks.add_task(
-        broadcast_bot_message,
-        group_id,
-        bot_msg
-    )
+    # delivered by the outbox dispatcher once this commits
+    queue_bot_event(db, group_id, bot_events.expense_added(expense, current_user, involved_users))
+    db.commit()
 
     return {
         "message": "expense added",
@@ -96,7 +74,7 @@ def add_expense(
 def list_expenses(
     group_id: int,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member())
 ):
     expenses = db.query(Expense).filter(
         Expense.group_id==group_id).order_by(Expense.date.desc()).all()
@@ -139,19 +117,9 @@ def list_expenses(
 def calculate_balance(
     group_id: int,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member())
 ):
     
-    member = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id==group_id)
-        .where(group_members.c.user_id==current_user.id)
-    ).first()
-    
-    if not member:
-        raise HTTPException(status_code=400, detail="user not in group")
-    
-    
     balances = {}
     
     expenses = db.query(Expense).filter(Expense.group_id==group_id).all()
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
 from database import SessionLocal
-from sqlalchemy.orm import Session
-from models import Group, User, group_members, GroupInvite,Expense
+from sqlalchemy.orm import Session, selectinload
+from models import Group, User, group_members, GroupInvite,Expense, expense_members, Settlement
 from Schemas import GroupCreate, AddMember
 from .auth import get_current_user
+from .membership import require_member, Membership
+from .chat import remove_member
+from services.membership_cache import membership_cache
 import secrets
 from datetime import datetime, timedelta
-from sqlalchemy import select
-from services.chat_services import broadcast_bot_message
+from sqlalchemy import select, func, case, and_
+from services.chat_services import queue_bot_event
+from services import bot_events
+from services import group_stats
 
 router = APIRouter(
     prefix="/groups",
@@ -30,12 +35,13 @@ def create_group(data: GroupCreate, db: Session=Depends(get_db), current_user: S
     group = Group(
         name = data.name,
         description = data.description,
-        created_by = current_user.id
+        created_by = current_user.id,
+        member_count = 1,
+        last_activity_at = datetime.utcnow()
     )
     
     db.add(group)
-    db.commit()
-    db.refresh(group)
+    db.flush()
     
     
     # add creater as the admin
@@ -45,6 +51,7 @@ def create_group(data: GroupCreate, db: Session=Depends(get_db), current_user: S
         role = "admin"
     ))
     db.commit()
+    membership_cache.invalidate(group.id, current_user.id)
     
     return {"message": "group created", "group_id": group.id}
 
@@ -54,23 +61,10 @@ def create_group(data: GroupCreate, db: Session=Depends(get_db), current_user: S
 def add_member(group_id: int,
                data: AddMember,
                db: Session=Depends(get_db),
-               current_user: User=Depends(get_current_user)
+               current_user: User=Depends(get_current_user),
+               membership: Membership=Depends(require_member("admin", "only admin can add members"))
                ):
     
-    group = db.query(Group).filter(Group.id == group_id).first()
-    if not group:
-        raise HTTPException(status_code=404, detail="group not found")
-    
-    role = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id == group_id) 
-        .where(group_members.c.user_id == current_user.id)
-    ).first()
-    
-    if not role or role.role != "admin":
-        raise HTTPException(status_code=401, detail="only admin can add members")
-    
-    
     user = db.query(User).filter(User.phone == data.phone).first()
     
     if not user:
@@ -90,11 +84,11 @@ def add_member(group_id: int,
         role = "member"
     ))
     
-    db.commit()
+    group_stats.bump(db, group_id, members=1)
+    queue_bot_event(db, group_id, bot_events.member_joined(user))
     
-    broadcast_bot_message(
-        group_id, f" {user.name} joined the group"
-    )
+    db.commit()
+    membership_cache.invalidate(group_id, user.id)
     
     return {"message": f"{user.name} added to the group"}
 
@@ -103,7 +97,8 @@ def add_member(group_id: int,
 def create_invite(
     group_id: int,
     db: Session=Depends(get_db), 
-    cureent_user: User=Depends(get_current_user)
+    cureent_user: User=Depends(get_current_user),
+    membership: Membership=Depends(require_member())
 ):
     
     token = secrets.token_urlsafe(16)
@@ -155,12 +150,12 @@ def join_group(
     )
 
     invite.used = True
-    db.commit()
+    group_stats.bump(db, invite.group_id, members=1)
     
-    broadcast_bot_message(
-        invite.group_id, f"{current_user.name} joined the group"
-    )
+    queue_bot_event(db, invite.group_id, bot_events.member_joined(current_user))
     
+    db.commit()
+    membership_cache.invalidate(invite.group_id, current_user.id)
     
 
     return {"message": "Joined group successfully"}
@@ -197,84 +192,171 @@ def my_groups(
     
     return result
     
+
+@router.get("/my-groups/summary")
+def my_groups_summary(
+    db: Session=Depends(get_db),
+    current_user: User=Depends(get_current_user)
+):
+    """
+    My groups with member count, total spent and last activity (the
+    maintained counters) plus my net balance, which uses the same sums as
+    the settlement calculation, in a single statement.
+    """
+    me = current_user.id
+    # alias so the split count doesn't correlate with the join below
+    em = expense_members.alias()
+
+    paid = select(func.coalesce(func.sum(Expense.amount), 0)).where(
+        Expense.group_id == Group.id,
+        Expense.paid_by == me
+    ).scalar_subquery()
+    split_count = select(func.count()).select_from(em).where(em.c.expense_id == Expense.id).scalar_subquery()
+    owed = (
+        select(func.coalesce(func.sum(Expense.amount / split_count), 0))
+        .join(expense_members, and_(
+            expense_members.c.expense_id == Expense.id,
+            expense_members.c.user_id == me
+        ))
+        .where(Expense.group_id == Group.id)
+        .scalar_subquery()
+    )
+    settled = select(func.coalesce(func.sum(case(
+        (Settlement.payer_id == me, Settlement.amount),
+        else_=-Settlement.amount
+    )), 0)).where(
+        Settlement.group_id == Group.id,
+        Settlement.is_paid == True,
+        Settlement.payer_id != Settlement.receiver_id,
+        (Settlement.payer_id == me) | (Settlement.receiver_id == me)
+    ).scalar_subquery()
+
+    rows = db.execute(
+        select(
+            Group.id, Group.name, Group.description, Group.created_by,
+            Group.member_count, Group.total_spent, Group.last_activity_at,
+            (paid - owed + settled).label("balance")
+        )
+        .join(group_members, and_(
+            group_members.c.group_id == Group.id,
+            group_members.c.user_id == me
+        ))
+    ).all()
+
+    result = []
+    for row in rows:
+        result.append({
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "created_by": row.created_by,
+            "member_count": row.member_count,
+            "total_spent": round(row.total_spent, 2),
+            "balance": round(row.balance, 2),
+            "last_activity": row.last_activity_at
+        })
+
+    return result
+
     
+# newest expenses sent with the dashboard, older ones come from /{group_id}/expenses
+DASHBOARD_EXPENSES = 20
+
+
+def _expense_page(db: Session, group_id: int, before: int | None, limit: int):
+    # newest first by id; next_cursor is the `before` for the following page
+    query = (
+        select(Expense)
+        .options(selectinload(Expense.payer))
+        .where(Expense.group_id == group_id)
+        .order_by(Expense.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(Expense.id < before)
+    expenses = db.execute(query).scalars().all()
+
+    more = len(expenses) > limit
+    expenses = expenses[:limit]
+    return {
+        "expenses": [
+            {
+                "id": expense.id,
+                "amount": expense.amount,
+                "note": expense.note,
+                "date": expense.date.isoformat() if expense.date else None,
+                "paid_by": expense.paid_by,
+                "payer": {
+                    "id": expense.payer.id,
+                    "name": expense.payer.name
+                } if expense.payer else None
+            } for expense in expenses
+        ],
+        "next_cursor": expenses[-1].id if more else None
+    }
+
+
 @router.get("/{group_id}")
 def group_dashboard(
     group_id: int,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member())
 ):
     group = db.query(Group).filter(Group.id==group_id).first()
     if not group:
-        raise HTTPException(status_code=400, detail="group not found")
-    
-    member = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id==group_id)
-        .where(group_members.c.user_id==current_user.id)
-    ).first()
-    
-    if not member:
-        raise HTTPException(status_code=400, detail="not a group member")
+        # deleted since the membership was cached
+        raise HTTPException(status_code=404, detail="group not found")
     
     members_with_roles = db.execute(
-        select(User, group_members.c.role)
+        select(User.id, User.name, User.phone, group_members.c.role)
         .join(group_members)
         .where(group_members.c.group_id==group_id)
     ).all()
     
-    expenses = db.query(Expense).filter(Expense.group_id==group_id).order_by(Expense.date.desc()).all()
-    
-    # Convert to JSON serializable format
-    return{
+    return {
         "group": {
             "id": group.id,
             "name": group.name,
             "description": group.description,
-            "created_by": group.created_by
+            "created_by": group.created_by,
+            "member_count": group.member_count,
+            "expense_count": group.expense_count,
+            "total_spent": round(group.total_spent, 2),
+            "last_activity": group.last_activity_at
         },
         "members": [
             {
                 "id": member.id,
                 "name": member.name,
                 "phone": member.phone,
-                "email": member.email,
-                "role": role
-            } for member, role in members_with_roles
+                "role": member.role
+            } for member in members_with_roles
         ],
-        "expenses": [
-            {
-                "id": expense.id,
-                "amount": expense.amount,
-                "note": expense.note,
-                "date": expense.date.isoformat() if expense.date else None,
-                "paid_by": expense.paid_by,
-                "payer": {
-                    "id": expense.payer.id,
-                    "name": expense.payer.name
-                } if expense.payer else None
-            } for expense in expenses
-        ]
+        **_expense_page(db, group_id, None, DASHBOARD_EXPENSES)
     }
+
+
+@router.get("/{group_id}/expenses")
+def group_expenses_page(
+    group_id: int,
+    before: int | None = Query(None),
+    limit: int = Query(DASHBOARD_EXPENSES, ge=1, le=100),
+    db: Session=Depends(get_db),
+    membership: Membership=Depends(require_member())
+):
+    return _expense_page(db, group_id, before, limit)
     
     
 @router.delete("/{group_id}/exit")
 def exit_group(
     group_id: int,
+    background_tasks: BackgroundTasks,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    current_user: User=Depends(get_current_user),
+    membership: Membership=Depends(require_member())
 ):
     
-    member = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id==group_id)
-        .where(group_members.c.user_id==current_user.id)
-    ).first()
-    
-    if not member:
-        raise HTTPException(status_code=404, detail="not a group member")
-    
-    if member.role == "admin":
+    if membership.is_admin:
         raise HTTPException(status_code=400, detail="admin cannot exit group, transfer admin rights first")
     
     db.execute(
@@ -282,11 +364,12 @@ def exit_group(
         .where(group_members.c.group_id==group_id)
         .where(group_members.c.user_id==current_user.id)
     )
-    db.commit()
+    group_stats.bump(db, group_id, members=-1)
     
-    broadcast_bot_message(
-        group_id,f"{current_user.name} left the group"
-    )
+    queue_bot_event(db, group_id, bot_events.member_left(current_user))
+    db.commit()
+    membership_cache.invalidate(group_id, current_user.id)
+    background_tasks.add_task(remove_member, group_id, current_user.id)
     
     return {"message": "exited group successfully"}
 
@@ -295,18 +378,9 @@ def get_group_member_profile(
     group_id: int,
     user_id: int,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member())
 ):
     
-    current = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id==group_id)
-        .where(group_members.c.user_id==current_user.id)
-    ).first()
-    
-    if not current:
-        raise HTTPException(status_code=404, detail="not a group member")
-    
     target = db.execute(
         group_members.select()
         .where(group_members.c.group_id==group_id)
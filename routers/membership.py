@@ -0,0 +1,103 @@
+# membership.py
+#
+# Shared "is the caller in this group (with this role)?" check for the
+# group scoped routes. Not a router, just the dependency.
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import select, and_
+from database import SessionLocal
+from models import Group, User, group_members
+from services.membership_cache import membership_cache, NO_GROUP, NOT_MEMBER
+from .auth import get_current_user
+
+
+class Membership:
+    __slots__ = ("group_id", "user_id", "role")
+
+    def __init__(self, group_id: int, user_id: int, role: str):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.role = role
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+
+def _lookup(group_id: int, user_id: int) -> str:
+    # group existence and the caller's role in one query
+    cached = membership_cache.get(group_id, user_id)
+    if cached is not None:
+        return cached
+
+    db = SessionLocal()
+    try:
+        row = db.execute(
+            select(Group.id, group_members.c.role)
+            .outerjoin(group_members, and_(
+                group_members.c.group_id == Group.id,
+                group_members.c.user_id == user_id
+            ))
+            .where(Group.id == group_id)
+        ).first()
+    finally:
+        db.close()
+
+    if row is None:
+        status = NO_GROUP
+    elif row.role is None:
+        status = NOT_MEMBER
+    else:
+        status = row.role
+    membership_cache.put(group_id, user_id, status)
+    return status
+
+
+def check_membership(
+    group_id: int,
+    user_id: int,
+    role: str | None = None,
+    detail: str | None = None,
+    request: Request | None = None
+) -> Membership:
+    """
+    Membership of user_id in group_id, or the HTTPException to send: 404 if
+    the group doesn't exist, 403 if the user isn't in it or lacks `role`.
+    With a request, the lookup is shared by every check in that request.
+    """
+    memo = None
+    if request is not None:
+        memo = getattr(request.state, "memberships", None)
+        if memo is None:
+            memo = request.state.memberships = {}
+
+    key = (group_id, user_id)
+    status = memo.get(key) if memo is not None else None
+    if status is None:
+        status = _lookup(group_id, user_id)
+        if memo is not None:
+            memo[key] = status
+
+    if status == NO_GROUP:
+        raise HTTPException(status_code=404, detail="group not found")
+    if status == NOT_MEMBER:
+        raise HTTPException(status_code=403, detail="not a group member")
+    if role is not None and status != role:
+        raise HTTPException(status_code=403, detail=detail or f"only {role} can do this")
+
+    return Membership(group_id, user_id, status)
+
+
+def require_member(role: str | None = None, detail: str | None = None):
+    """
+    Dependency for routes with a {group_id} path parameter:
+    `membership: Membership = Depends(require_member("admin"))`.
+    """
+    def dependency(
+        group_id: int,
+        request: Request,
+        current_user: User = Depends(get_current_user)
+    ) -> Membership:
+        return check_membership(group_id, current_user.id, role, detail, request)
+
+    return dependency
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from services.metrics import metrics
+from services.connection_registry import registry
+from services.auth_cache import auth_cache
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics(authorization: str | None = Header(None)):
+
+    # scrapers send "Bearer <METRICS_TOKEN>" when one is configured
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="invalid metrics token")
+
+    metrics.set("chat_connections", len(registry))
+    metrics.set("auth_cache_entries", len(auth_cache))
+    metrics.set("auth_cache_hit_ratio", auth_cache.hit_ratio())
+
+    return metrics.render()
@@ -1,9 +1,11 @@
 from fastapi import APIRouter,Depends,HTTPException
-from models import User, Expense, Group, group_members,expense_members, Settlement
+from models import User, Expense,expense_members, Settlement
 from .auth import get_current_user, get_db
+from .membership import require_member, Membership
 from sqlalchemy.orm import Session
-from services.chat_services import broadcast_bot_message
-from fastapi import BackgroundTasks
+from services.chat_services import queue_bot_event
+from services import bot_events
+from sqlalchemy.orm import joinedload
 
 router = APIRouter(
     prefix="/settlements",
@@ -59,20 +61,10 @@ def generate_settlements(balances: dict[int, float], db:Session=Depends(get_db))
 @router.post("/{group_id}/settle")
 def settle_group(
     group_id: int,
-    background_tasks: BackgroundTasks,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member("admin", "only admin can settle"))
     
 ):
-    role = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id==group_id)
-        .where(group_members.c.user_id==current_user.id)
-    ).first()
-    
-    if not role or role.role != "admin":
-        raise HTTPException(status_code=404, detail="only admin can settle")
-    
     # Clear existing pending settlements before generating new ones
     existing_pending = db.query(Settlement).filter(
         Settlement.group_id==group_id,
@@ -123,23 +115,24 @@ def settle_group(
     
     user_map = {u.id: u.name for u in users}
     
-    for s in settlements:
-        record = Settlement(
+    records = [
+        Settlement(
             group_id = group_id,
             payer_id = s["from"],
             receiver_id = s["to"],
             amount = s["amount"]
         )
-        db.add(record)
-        db.commit()
-        db.refresh(record)
-        
-        
-        msg = f"{user_map[s['from']]} has to pay {user_map[s['to']]} {s['amount']}"
+        for s in settlements
+    ]
+    db.add_all(records)
+    db.flush()
+    
+    for record in records:
+        queue_bot_event(db, group_id, bot_events.settlement_due(
+            record, user_map[record.payer_id], user_map[record.receiver_id]
+        ))
         
-        background_tasks.add_task(
-            broadcast_bot_message, group_id, msg
-        )
+    db.commit()
         
         
     return{
@@ -155,7 +148,9 @@ def mark_paid(
     db: Session=Depends(get_db),
     user: User=Depends(get_current_user)
 ):
-    settlement = db.query(Settlement).filter(Settlement.id==settlement_id).first()
+    settlement = db.query(Settlement).options(
+        joinedload(Settlement.receiver)
+    ).filter(Settlement.id==settlement_id).first()
     
     if not settlement:
         raise HTTPException(status_code=400, detail="settlement not found")
@@ -165,11 +160,9 @@ def mark_paid(
     
     
     settlement.is_paid = True
-    db.commit()
-    
-    msg = f"payment completed: {user.name} paid {settlement.amount} to {settlement.receiver.name}"
     
-    broadcast_bot_message(settlement.group_id, msg)
+    queue_bot_event(db, settlement.group_id, bot_events.settlement_paid(settlement, user, settlement.receiver))
+    db.commit()
     
     return{"message": "marked as paid"}
 
@@ -180,19 +173,9 @@ def mark_paid(
 def settlement_history(
     group_id: int,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member())
 ):
     
-    member = db.execute(
-        group_members.select()
-        .where(group_members.c.group_id==group_id)
-        .where(group_members.c.user_id==current_user.id)
-    ).first()
-    
-    if not member:
-        raise HTTPException(status_code=404, detail="user not belongs to the group")
-    
-    
     records = db.query(Settlement).filter(
         Settlement.group_id==group_id,
         Settlement.is_paid==True
@@ -217,17 +200,9 @@ def settlement_history(
 def pending_history(
     group_id: int,
     db: Session=Depends(get_db),
-    current_user: User=Depends(get_current_user)
+    membership: Membership=Depends(require_member())
 ):
     
-    member = db.execute(group_members.select()
-                        .where(group_members.c.group_id==group_id)
-                        .where(group_members.c.user_id==current_user.id)
-                        ).first()
-    
-    if not member:
-        raise HTTPException(status_code=404, detail="user not belongs to the group")
-    
     records = db.query(Settlement).filter(
         Settlement.group_id==group_id,
         Settlement.is_paid==False
@@ -0,0 +1,92 @@
+# scripts/bench_chat_codec.py
+#
+# Bytes on the wire and CPU per broadcast for the chat codecs, fanned out to
+# N recipients. permessage-deflate is approximated with one raw deflate
+# stream per recipient (context takeover, like the websockets library).
+#
+#   python scripts/bench_chat_codec.py --recipients 1000 --messages 50
+
+import argparse
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chat_codec import encode, FrameCache, JSON, MSGPACK, msgpack
+
+
+def sample_payloads(count: int):
+    payloads = []
+    for i in range(count):
+        if i % 2:
+            payloads.append({
+                "event": "bot_message",
+                "message": {
+                    "id": 10_000 + i,
+                    "content": f"💸 Asha added ₹{120 + i} for dinner #{i}\n👥 Split between: Asha, Ravi, Meera, Kabir",
+                    "timestamp": "2026-10-19T12:30:45.123456"
+                },
+                "group_id": 42
+            })
+        else:
+            payloads.append({
+                "event": "message",
+                "message": {
+                    "id": 10_000 + i,
+                    "sender_id": 7,
+                    "sender_name": "Ravi",
+                    "content": f"ok, I'll pay for the cab tomorrow ({i})",
+                    "timestamp": "2026-10-19T12:30:46.654321"
+                },
+                "group_id": 42
+            })
+    return payloads
+
+
+def run(label, payloads, recipients, codec, once, deflate):
+    compressors = [zlib.compressobj(wbits=-zlib.MAX_WBITS) for _ in range(recipients)] if deflate else None
+    wire = 0
+    started = time.process_time()
+
+    for payload in payloads:
+        frames = FrameCache(payload)
+        for r in range(recipients):
+            # the old path called json.dumps for every socket
+            frame = frames.get(codec) if once else encode(codec, payload)
+            data = frame.encode() if isinstance(frame, str) else frame
+            if deflate:
+                c = compressors[r]
+                data = c.compress(data) + c.flush(zlib.Z_SYNC_FLUSH)
+            wire += len(data)
+
+    cpu = time.process_time() - started
+    per_broadcast_ms = cpu / len(payloads) * 1000
+    per_message_bytes = wire / (len(payloads) * recipients)
+    print(f"{label:<34} {per_message_bytes:>8.1f} B/frame {per_broadcast_ms:>9.3f} ms CPU/broadcast")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+
+    payloads = sample_payloads(args.messages)
+    print(f"{args.messages} broadcasts to {args.recipients} recipients\n")
+
+    run("json, encoded per socket (old)", payloads, args.recipients, JSON, once=False, deflate=False)
+    run("json, encoded once", payloads, args.recipients, JSON, once=True, deflate=False)
+    run("json + deflate", payloads, args.recipients, JSON, once=True, deflate=True)
+
+    if msgpack is None:
+        print("\nmsgpack not installed, skipping binary codec")
+        return
+
+    run("msgpack, encoded once", payloads, args.recipients, MSGPACK, once=True, deflate=False)
+    run("msgpack + deflate", payloads, args.recipients, MSGPACK, once=True, deflate=True)
+
+
+if __name__ == "__main__":
+    main()
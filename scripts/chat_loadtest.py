@@ -0,0 +1,296 @@
+# scripts/chat_loadtest.py
+#
+# Opens N authenticated chat sockets spread over M groups against a running
+# app and drives a mix of message and typing events. Reports end-to-end
+# fan-out latency percentiles, dropped frames, server memory per connection
+# and event-loop lag.
+#
+# Point the app and this tool at the same database and SECRET_KEY, e.g.
+#
+#   export DATABASE_URL=sqlite:///./loadtest.db SECRET_KEY=loadtest
+#   uvicorn main:app --port 8000 &
+#   python scripts/chat_loadtest.py --clients 2000 --groups 100 --server-pid $!
+#
+# Users and groups are created on first run (phones prefixed "lt-") and
+# reused afterwards.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+from sqlalchemy import select
+from database import SessionLocal, engine, Base
+from models import User, Group, group_members
+from routers.auth import create_access_token, hash_password
+from services.chat_codec import msgpack
+from services import group_stats
+
+
+PHONE_PREFIX = "lt-"
+
+
+def seed(clients: int, groups: int):
+    """
+    Creates (or reuses) the load users and groups, returns
+    [(user_id, group_id)] with client i in group i % groups.
+    """
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        users = {
+            u.phone: u for u in
+            db.query(User).filter(User.phone.like(f"{PHONE_PREFIX}%")).all()
+        }
+        # everyone shares one hash, the password is "loadtest"
+        password_hash = hash_password("loadtest")
+        for i in range(clients):
+            phone = f"{PHONE_PREFIX}{i}"
+            if phone not in users:
+                users[phone] = User(name=f"load {i}", phone=phone, password_hash=password_hash)
+                db.add(users[phone])
+        db.flush()
+
+        group_rows = db.query(Group).filter(Group.name.like("loadtest %")).order_by(Group.id).all()
+        while len(group_rows) < groups:
+            group = Group(name=f"loadtest {len(group_rows)}", created_by=users[f"{PHONE_PREFIX}0"].id)
+            db.add(group)
+            db.flush()
+            group_rows.append(group)
+
+        existing = set(db.execute(
+            select(group_members.c.group_id, group_members.c.user_id)
+            .where(group_members.c.group_id.in_([g.id for g in group_rows]))
+        ).all())
+
+        pairs = []
+        for i in range(clients):
+            user = users[f"{PHONE_PREFIX}{i}"]
+            group = group_rows[i % groups]
+            if (group.id, user.id) not in existing:
+                db.execute(group_members.insert().values(group_id=group.id, user_id=user.id, role="member"))
+                group_stats.bump(db, group.id, members=1)
+            pairs.append((user.id, group.id))
+
+        db.commit()
+        return pairs
+    finally:
+        db.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def rss_kb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class Stats:
+
+    def __init__(self):
+        self.sent = {}            # tag -> (group_id, sent_at)
+        self.received = {}        # tag -> receipts
+        self.latencies = []
+        self.typing_sent = 0
+        self.typing_frames = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.probe_rtts = []
+        self.client_lag = []
+
+
+class LoadClient:
+
+    def __init__(self, index, user_id, group_id, args, stats):
+        self.index = index
+        self.user_id = user_id
+        self.group_id = group_id
+        self.args = args
+        self.stats = stats
+        self.seq = 0
+        self.ws = None
+        self.binary = args.codec == "msgpack"
+
+    def encode(self, payload):
+        return msgpack.packb(payload) if self.binary else json.dumps(payload)
+
+    def decode(self, frame):
+        return msgpack.unpackb(frame, raw=False) if isinstance(frame, bytes) else json.loads(frame)
+
+    async def connect(self):
+        token = create_access_token({"sub": str(self.user_id)})
+        url = f"{self.args.url}/chat/ws/{self.group_id}?token={token}"
+        subprotocols = ["smartsplitter.msgpack"] if self.binary else None
+        try:
+            self.ws = await websockets.connect(
+                url,
+                subprotocols=subprotocols,
+                max_queue=None,
+                ping_interval=None,
+                open_timeout=30
+            )
+        except Exception:
+            self.stats.connect_failures += 1
+            self.ws = None
+
+    async def read(self):
+        try:
+            async for frame in self.ws:
+                now = time.time()
+                data = self.decode(frame)
+                event = data.get("event")
+
+                if event == "ping":
+                    await self.ws.send(self.encode({"event": "pong"}))
+                elif event == "message":
+                    tag = data["message"]["content"]
+                    sent = self.stats.sent.get(tag)
+                    if sent:
+                        self.stats.received[tag] = self.stats.received.get(tag, 0) + 1
+                        self.stats.latencies.append(now - sent[1])
+                elif event == "typing":
+                    self.stats.typing_frames += 1
+        except websockets.ConnectionClosed:
+            self.stats.disconnects += 1
+
+    async def drive(self, until):
+        rng = random.Random(self.index)
+        interval = 1 / self.args.rate
+        # spread the first sends so clients don't fire in lockstep
+        await asyncio.sleep(rng.random() * interval)
+
+        while time.monotonic() < until:
+            try:
+                if rng.random() < self.args.typing_ratio:
+                    await self.ws.send(self.encode({"event": "typing"}))
+                    self.stats.typing_sent += 1
+                else:
+                    self.seq += 1
+                    tag = f"lt:{self.index}:{self.seq}"
+                    self.stats.sent[tag] = (self.group_id, time.time())
+                    await self.ws.send(self.encode({"event": "message", "content": tag}))
+            except websockets.ConnectionClosed:
+                return
+            await asyncio.sleep(rng.expovariate(1 / interval))
+
+
+async def probe_server(args, user_id, stats, until):
+    """
+    Round trips on the multiplexed socket that the server answers without
+    touching the DB, so the RTT is dominated by its event-loop lag.
+    """
+    token = create_access_token({"sub": str(user_id)})
+    async with websockets.connect(f"{args.url}/chat/ws?token={token}&groups=", ping_interval=None) as ws:
+        await ws.recv()
+        while time.monotonic() < until:
+            started = time.perf_counter()
+            await ws.send(json.dumps({"event": "unsubscribe", "groups": []}))
+            while True:
+                data = json.loads(await ws.recv())
+                if data.get("event") == "subscribed":
+                    break
+            stats.probe_rtts.append(time.perf_counter() - started)
+            await asyncio.sleep(0.1)
+
+
+async def watch_own_loop(stats, until):
+    # lag of this tool's loop, if it is high the numbers above are suspect
+    while time.monotonic() < until:
+        started = time.perf_counter()
+        await asyncio.sleep(0.05)
+        stats.client_lag.append(time.perf_counter() - started - 0.05)
+
+
+async def main(args):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.clients * 2 + 256)), hard))
+
+    pairs = seed(args.clients, args.groups)
+    group_sizes = {}
+    for _, group_id in pairs:
+        group_sizes[group_id] = group_sizes.get(group_id, 0) + 1
+
+    stats = Stats()
+    clients = [LoadClient(i, user_id, group_id, args, stats) for i, (user_id, group_id) in enumerate(pairs)]
+
+    rss_before = rss_kb(args.server_pid) if args.server_pid else None
+
+    print(f"connecting {args.clients} clients across {args.groups} groups ...")
+    started = time.perf_counter()
+    for i in range(0, len(clients), args.connect_batch):
+        await asyncio.gather(*(c.connect() for c in clients[i:i + args.connect_batch]))
+    connected = [c for c in clients if c.ws is not None]
+    print(f"connected {len(connected)} in {time.perf_counter() - started:.1f}s ({stats.connect_failures} failed)")
+
+    rss_after = rss_kb(args.server_pid) if args.server_pid else None
+
+    readers = [asyncio.create_task(c.read()) for c in connected]
+    until = time.monotonic() + args.duration
+    await asyncio.gather(
+        *(c.drive(until) for c in connected),
+        probe_server(args, pairs[0][0], stats, until),
+        watch_own_loop(stats, until)
+    )
+
+    # let in-flight fan-out land before counting drops
+    await asyncio.sleep(args.drain)
+    for c in connected:
+        await c.ws.close()
+    for r in readers:
+        r.cancel()
+
+    connected_per_group = {}
+    for c in connected:
+        connected_per_group[c.group_id] = connected_per_group.get(c.group_id, 0) + 1
+
+    expected = sum(connected_per_group.get(group_id, 0) for group_id, _ in stats.sent.values())
+    delivered = sum(stats.received.values())
+    ms = lambda v: f"{v * 1000:.1f}ms"
+
+    print()
+    print(f"messages sent        {len(stats.sent)}  ({len(stats.sent) / args.duration:.0f}/s)")
+    print(f"typing events sent   {stats.typing_sent}, typing frames received {stats.typing_frames}")
+    print(f"frames delivered     {delivered} of {expected} expected, dropped {expected - delivered}")
+    print(f"fan-out latency      p50 {ms(percentile(stats.latencies, 50))}  p95 {ms(percentile(stats.latencies, 95))}"
+          f"  p99 {ms(percentile(stats.latencies, 99))}  max {ms(max(stats.latencies, default=0))}")
+    print(f"server loop probe    p50 {ms(percentile(stats.probe_rtts, 50))}  p99 {ms(percentile(stats.probe_rtts, 99))}"
+          f"  max {ms(max(stats.probe_rtts, default=0))}")
+    print(f"load tool loop lag   p99 {ms(percentile(stats.client_lag, 99))}")
+    print(f"unexpected closes    {stats.disconnects}")
+    if rss_before and rss_after and connected:
+        print(f"server memory        {(rss_after - rss_before) / len(connected):.1f} KiB per connection"
+              f" (RSS {rss_before // 1024} -> {rss_after // 1024} MiB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--rate", type=float, default=0.2, help="events per second per client")
+    parser.add_argument("--typing-ratio", type=float, default=0.5, help="share of events that are typing")
+    parser.add_argument("--codec", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--connect-batch", type=int, default=200)
+    parser.add_argument("--drain", type=float, default=3, help="seconds to wait for late frames")
+    parser.add_argument("--server-pid", type=int, help="sample the server's RSS from /proc")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,109 @@
+# services/auth_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from models import User
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# other workers only see a profile or password change after this long
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+metrics.describe("auth_cache_requests_total", "get_current_user lookups, by whether the principal was cached")
+metrics.describe("auth_cache_hit_ratio", "Share of get_current_user lookups answered from the cache")
+
+
+def _snapshot(user: User) -> User:
+    # a detached copy, so the cached object never belongs to a request session
+    copy = User(**{c.key: getattr(user, c.key) for c in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+
+class AuthCache:
+    """
+    Bounded LRU of authenticated users keyed by access token. Entries live
+    for AUTH_CACHE_TTL_SECONDS, never past the token's own expiry, and are
+    dropped as soon as the user row is updated or deleted in this process.
+    """
+
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, User, str | None]] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        # (user, jti) of a cached token, or None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                metrics.inc("auth_cache_requests_total", result="hit")
+                return entry[1], entry[2]
+            if entry is not None:
+                self._remove(token)
+            self.misses += 1
+        metrics.inc("auth_cache_requests_total", result="miss")
+        return None
+
+    def put(self, token: str, user: User, token_expires_at: float | None = None, jti: str | None = None):
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (expires_at, _snapshot(user), jti)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._remove(token)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[1].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[1].id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+auth_cache = AuthCache()
+
+
+# profile or password changed (or user removed): drop their cached principals
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    auth_cache.invalidate_user(target.id)
@@ -0,0 +1,81 @@
+# services/bot_events.py
+#
+# Builders for the automatic chat messages. They only read objects the route
+# already has in memory, so building an event never costs a query.
+
+from models import Expense, Settlement, User
+
+
+class BotEvent:
+    __slots__ = ("kind", "content", "data")
+
+    def __init__(self, kind: str, content: str, data: dict | None = None):
+        self.kind = kind
+        self.content = content
+        self.data = data or {}
+
+
+def expense_added(expense: Expense, payer: User, involved: list[User]) -> BotEvent:
+    name_list = ", ".join(u.name for u in involved)
+    return BotEvent(
+        "expense_added",
+        f"💸 {payer.name} added ₹{expense.amount} "
+        f"for {expense.note or 'expense'}\n"
+        f"👥 Split between: {name_list}",
+        {
+            "expense_id": expense.id,
+            "amount": expense.amount,
+            "note": expense.note,
+            "paid_by": payer.id,
+            "involved_user_ids": [u.id for u in involved]
+        }
+    )
+
+
+def member_joined(user: User) -> BotEvent:
+    return BotEvent("member_joined", f"{user.name} joined the group", {"user_id": user.id})
+
+
+def member_left(user: User) -> BotEvent:
+    return BotEvent("member_left", f"{user.name} left the group", {"user_id": user.id})
+
+
+def member_removed(user: User, removed_by: User) -> BotEvent:
+    return BotEvent(
+        "member_removed",
+        f"{user.name} was removed from the group by {removed_by.name}",
+        {"user_id": user.id, "removed_by": removed_by.id}
+    )
+
+
+def _settlement_data(settlement: Settlement) -> dict:
+    return {
+        "settlement_id": settlement.id,
+        "payer_id": settlement.payer_id,
+        "receiver_id": settlement.receiver_id,
+        "amount": settlement.amount
+    }
+
+
+def settlement_due(settlement: Settlement, payer_name: str, receiver_name: str) -> BotEvent:
+    return BotEvent(
+        "settlement_due",
+        f"{payer_name} has to pay {receiver_name} {settlement.amount}",
+        _settlement_data(settlement)
+    )
+
+
+def settlement_paid(settlement: Settlement, payer: User, receiver: User) -> BotEvent:
+    return BotEvent(
+        "settlement_paid",
+        f"payment completed: {payer.name} paid {settlement.amount} to {receiver.name}",
+        _settlement_data(settlement)
+    )
+
+
+def settlement_undone(settlement: Settlement, payer: User, receiver: User) -> BotEvent:
+    return BotEvent(
+        "settlement_undone",
+        f"Settlement undone: {payer.name} → {receiver.name} ₹{settlement.amount}",
+        _settlement_data(settlement)
+    )
@@ -0,0 +1,187 @@
+# services/chat_archive.py
+
+import asyncio
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session, joinedload
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, engine
+from models import ChatMessage, ChatArchive, chat_read_receipts
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "5000"))
+
+metrics.describe("chat_archived_messages_total", "Chat messages moved from chat_messages into chat_archive")
+
+
+def pack(payloads: list[dict]) -> bytes:
+    return zlib.compress(json.dumps(payloads, separators=(",", ":")).encode())
+
+
+def unpack(blob: bytes) -> list[dict]:
+    return json.loads(zlib.decompress(blob))
+
+
+def archived_before(db: Session, group_id: int, before_id: int | None, limit: int) -> list[dict]:
+    """
+    Newest `limit` archived payloads of a group with id < before_id, oldest
+    first. Blobs are read newest first and reading stops once we have enough.
+    """
+    query = select(ChatArchive).where(ChatArchive.group_id == group_id)
+    if before_id is not None:
+        query = query.where(ChatArchive.first_id < before_id)
+
+    found = []
+    for chunk in db.execute(query.order_by(ChatArchive.last_id.desc())).scalars():
+        payloads = [
+            p for p in unpack(chunk.blob)
+            if before_id is None or p["message"]["id"] < before_id
+        ]
+        found = payloads + found
+        if len(found) >= limit:
+            break
+
+    found.sort(key=lambda p: p["message"]["id"])
+    return found[-limit:] if limit else []
+
+
+def sent_at(payload: dict) -> datetime:
+    return datetime.fromisoformat(payload["message"]["timestamp"])
+
+
+def archived_since(db: Session, group_id: int, since: datetime, limit: int) -> list[dict]:
+    # oldest `limit` archived payloads of a group sent at or after `since`
+    query = (
+        select(ChatArchive)
+        .where(ChatArchive.group_id == group_id)
+        .where(ChatArchive.month >= since.strftime("%Y-%m"))
+        .order_by(ChatArchive.month.asc(), ChatArchive.first_id.asc())
+    )
+
+    found, month = [], None
+    for chunk in db.execute(query).scalars():
+        # chunks of one month can interleave, only stop between months
+        if len(found) >= limit and chunk.month != month:
+            break
+        month = chunk.month
+        found += [p for p in unpack(chunk.blob) if sent_at(p) >= since]
+
+    found.sort(key=lambda p: (sent_at(p), p["message"]["id"]))
+    return found[:limit]
+
+
+def archived_timestamp(db: Session, group_id: int, message_id: int) -> datetime | None:
+    chunks = db.execute(
+        select(ChatArchive)
+        .where(ChatArchive.group_id == group_id)
+        .where(ChatArchive.first_id <= message_id)
+        .where(ChatArchive.last_id >= message_id)
+    ).scalars()
+    for chunk in chunks:
+        for payload in unpack(chunk.blob):
+            if payload["message"]["id"] == message_id:
+                return sent_at(payload)
+    return None
+
+
+class ChatArchiver:
+    """
+    Moves chat messages older than ARCHIVE_AFTER_DAYS out of chat_messages
+    into compressed per-group, per-month blobs in chat_archive, so the hot
+    table and its (group_id, id) index stay small. Archived messages keep
+    their ids and the sender name they had at archival time. Their read
+    receipts are dropped with them.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                archived = await run_in_threadpool(self.archive)
+                if archived:
+                    print(f"Archived {archived} chat messages")
+            except Exception as e:
+                print(f"Chat archival failed: {str(e)}")
+            await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+    def archive(self) -> int:
+        total = 0
+        cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+        while True:
+            moved = self._archive_batch(cutoff)
+            total += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                return total
+
+    @staticmethod
+    def _archive_batch(cutoff: datetime) -> int:
+        # chat_history reads through this module, import it lazily
+        from services.chat_history import message_payload
+
+        db = SessionLocal()
+        try:
+            query = (
+                select(ChatMessage)
+                .options(joinedload(ChatMessage.sender))
+                .where(ChatMessage.timestamp < cutoff)
+                .order_by(ChatMessage.group_id, ChatMessage.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+            )
+            if engine.dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True, of=ChatMessage)
+            messages = db.execute(query).scalars().all()
+            if not messages:
+                return 0
+
+            def chunk_key(msg):
+                return msg.group_id, msg.timestamp.strftime("%Y-%m")
+
+            for (group_id, month), chunk in groupby(messages, key=chunk_key):
+                chunk = list(chunk)
+                db.add(ChatArchive(
+                    group_id=group_id,
+                    month=month,
+                    first_id=chunk[0].id,
+                    last_id=chunk[-1].id,
+                    count=len(chunk),
+                    blob=pack([message_payload(msg) for msg in chunk])
+                ))
+
+            ids = [msg.id for msg in messages]
+            # sqlite doesn't enforce the cascade, do it by hand everywhere
+            db.execute(delete(chat_read_receipts).where(chat_read_receipts.c.message_id.in_(ids)))
+            db.execute(delete(ChatMessage).where(ChatMessage.id.in_(ids)))
+            db.commit()
+        finally:
+            db.close()
+
+        metrics.inc("chat_archived_messages_total", len(ids))
+        return len(ids)
+
+
+chat_archiver = ChatArchiver()
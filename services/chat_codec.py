@@ -0,0 +1,66 @@
+# services/chat_codec.py
+
+import json
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # optional, sockets stay on JSON without it
+    msgpack = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Sec-WebSocket-Protocol values a client can offer
+SUBPROTOCOLS = {
+    "smartsplitter.json": JSON,
+    "smartsplitter.msgpack": MSGPACK,
+}
+
+
+def negotiate(websocket: WebSocket):
+    """
+    Pick the codec for a socket from the subprotocols the client offered.
+    Returns (codec, subprotocol to echo back). Clients that offer nothing
+    get plain JSON text frames, exactly as before.
+    """
+    offered = websocket.scope.get("subprotocols") or []
+
+    for subprotocol in offered:
+        codec = SUBPROTOCOLS.get(subprotocol)
+        if codec == MSGPACK and msgpack is None:
+            continue
+        if codec:
+            return codec, subprotocol
+
+    return JSON, None
+
+
+def encode(codec: str, payload: dict):
+    if codec == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload)
+
+
+def decode(message: dict) -> dict:
+    # a raw ASGI receive message, text frames are always JSON
+    if message.get("bytes") is not None:
+        return msgpack.unpackb(message["bytes"], raw=False)
+    return json.loads(message["text"])
+
+
+class FrameCache:
+    """
+    Encodes a broadcast payload once per codec instead of once per socket.
+    """
+
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self._frames = {}
+
+    def get(self, codec: str):
+        frame = self._frames.get(codec)
+        if frame is None:
+            frame = self._frames[codec] = encode(codec, self.payload)
+        return frame
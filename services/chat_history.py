@@ -0,0 +1,401 @@
+# services/chat_history.py
+
+import json
+import os
+import threading
+import time
+from collections import deque, OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from database import SessionLocal
+from models import ChatMessage
+from services.metrics import metrics
+from services.chat_archive import archived_before, archived_since, archived_timestamp, sent_at
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+RING_BUFFER_SIZE = int(os.getenv("CHAT_RING_BUFFER_SIZE", "200"))
+# all rings together stay under this, least recently used groups go first
+HISTORY_MEMORY_BYTES = int(os.getenv("CHAT_HISTORY_MEMORY_BYTES", str(32 * 1024 * 1024)))
+MAX_REPLAY = 500
+# other workers write messages this one never broadcasts; a ring not
+# checked against the DB for this long is topped up before it's served
+HISTORY_TTL_SECONDS = float(os.getenv("CHAT_HISTORY_TTL_SECONDS", "2"))
+# resume replays from this long before the client's last message, since
+# ids and commit order don't follow send order across workers; clients
+# drop the repeats by id
+RESUME_OVERLAP_SECONDS = float(os.getenv("CHAT_RESUME_OVERLAP_SECONDS", "5"))
+# rough cost of the payload dict and tuple kept next to the serialized item
+ENTRY_OVERHEAD_BYTES = 400
+
+metrics.describe("chat_history_reads_total", "History page reads, by where they were served from")
+metrics.describe("chat_history_refreshes_total", "Rings topped up from the database after CHAT_HISTORY_TTL_SECONDS")
+metrics.describe("chat_history_evictions_total", "Whole groups dropped from the ring buffer to stay under the memory cap")
+
+
+def message_payload(msg: ChatMessage) -> dict:
+    # same shape the socket broadcasts, so replayed frames look live
+    if msg.sender_type == "bot":
+        payload = {
+            "event": "bot_message",
+            "message": {
+                "id": msg.id,
+                "content": msg.content,
+                "timestamp": msg.timestamp.isoformat()
+            }
+        }
+        if msg.kind:
+            payload["kind"] = msg.kind
+            payload["data"] = msg.data or {}
+        return payload
+    return {
+        "event": "message",
+        "message": {
+            "id": msg.id,
+            "sender_id": msg.sender_id,
+            "sender_name": msg.sender.name if msg.sender else "Unknown",
+            "content": msg.content,
+            "timestamp": msg.timestamp.isoformat()
+        }
+    }
+
+
+def history_item(payload: dict) -> dict:
+    # the shape GET /chat/{group_id}/messages returns
+    message = payload["message"]
+    if payload["event"] == "bot_message":
+        return {
+            "id": message["id"],
+            "content": message["content"],
+            "timestamp": message["timestamp"],
+            "type": "bot"
+        }
+    return {
+        "id": message["id"],
+        "content": message["content"],
+        "sender_id": message["sender_id"],
+        "sender_name": message["sender_name"],
+        "timestamp": message["timestamp"],
+        "type": "user"
+    }
+
+
+def _order(entry):
+    # send order; ids alone aren't, they're reserved in blocks per worker
+    return entry[4], entry[0]
+
+
+class GroupRing:
+    """
+    Last RING_BUFFER_SIZE messages of one group, each kept as the broadcast
+    payload plus its history item already serialized. `covered_since` is
+    the send time after which the ring holds every message of the group
+    (datetime.min once it holds all of them), so reads from later than
+    that can be answered without the DB.
+    """
+
+    def __init__(self, maxlen: int):
+        self.entries = deque(maxlen=maxlen)
+        self.covered_since = None
+        self.size = 0
+        # last time the DB was read into the ring: monotonic, and the wall
+        # clock the query started at (what message timestamps compare to)
+        self.synced_at = None
+        self.synced_from = None
+
+    def append(self, message_id: int, payload: dict) -> int:
+        timestamp = sent_at(payload)
+        if self.covered_since is None:
+            # anything before the first message we see was sent before
+            # this process started
+            self.covered_since = timestamp
+
+        freed = 0
+        if len(self.entries) == self.entries.maxlen:
+            evicted = self.entries[0]
+            self.covered_since = max(self.covered_since, evicted[4])
+            freed = evicted[3]
+
+        serialized = json.dumps(history_item(payload))
+        size = len(serialized) + ENTRY_OVERHEAD_BYTES
+        self.entries.append((message_id, payload, serialized, size, timestamp))
+        self.size += size - freed
+        return size - freed
+
+    def remove(self, message_id: int) -> int:
+        for entry in self.entries:
+            if entry[0] == message_id:
+                self.entries.remove(entry)
+                self.size -= entry[3]
+                return entry[3]
+        return 0
+
+    def since(self, last_id: int):
+        cursor = next((entry for entry in self.entries if entry[0] == last_id), None)
+        if cursor is None or self.covered_since is None:
+            return None
+        since = cursor[4] - timedelta(seconds=RESUME_OVERLAP_SECONDS)
+        if since <= self.covered_since:
+            return None
+        return [
+            entry[1] for entry in sorted(self.entries, key=_order)
+            if entry[4] >= since and entry[0] != last_id
+        ]
+
+    def latest(self, limit: int):
+        """
+        Serialized history items of the newest `limit` messages, or None when
+        the ring can't vouch that nothing older is missing from the answer.
+        """
+        complete = self.covered_since == datetime.min
+        if len(self.entries) < limit and not complete:
+            return None
+        entries = sorted(self.entries, key=_order)[-limit:]
+        return [entry[2] for entry in entries]
+
+
+class ChatHistory:
+
+    def __init__(self, ring_size: int = RING_BUFFER_SIZE, memory_bytes: int = HISTORY_MEMORY_BYTES):
+        self.ring_size = ring_size
+        self.memory_bytes = memory_bytes
+        self.rings: OrderedDict[int, GroupRing] = OrderedDict()
+        self.size = 0
+        # recorded on the event loop, warmed from request threads
+        self._lock = threading.Lock()
+
+    def _evict(self, keep: int):
+        while self.size > self.memory_bytes and len(self.rings) > 1:
+            group_id, ring = next(iter(self.rings.items()))
+            if group_id == keep:
+                self.rings.move_to_end(group_id)
+                continue
+            del self.rings[group_id]
+            self.size -= ring.size
+            metrics.inc("chat_history_evictions_total")
+
+    def record(self, group_id: int, payload: dict):
+        message_id = payload["message"]["id"]
+        with self._lock:
+            ring = self.rings.get(group_id)
+            if ring is None:
+                ring = self.rings[group_id] = GroupRing(self.ring_size)
+            else:
+                self.rings.move_to_end(group_id)
+            self.size += ring.append(message_id, payload)
+            self._evict(keep=group_id)
+
+    def forget(self, group_id: int, message_id: int):
+        # a broadcast message whose row never made it to the DB
+        with self._lock:
+            ring = self.rings.get(group_id)
+            if ring is not None:
+                self.size -= ring.remove(message_id)
+
+    def drop_group(self, group_id: int):
+        with self._lock:
+            ring = self.rings.pop(group_id, None)
+            if ring is not None:
+                self.size -= ring.size
+
+    def since(self, group_id: int, last_id: int):
+        ring = self._fresh(group_id)
+        if ring is None:
+            return None
+        with self._lock:
+            return ring.since(last_id)
+
+    def _fresh(self, group_id: int):
+        # the group's ring, topped up from the DB first when it's stale
+        with self._lock:
+            ring = self.rings.get(group_id)
+            if ring is None:
+                return None
+            if ring.synced_at is not None and time.monotonic() - ring.synced_at < HISTORY_TTL_SECONDS:
+                return ring
+        if ring.synced_from is None:
+            # only ever recorded here, never read from the DB
+            return self._warm(group_id)
+        return self._top_up(group_id, ring)
+
+    def _top_up(self, group_id: int, ring: GroupRing):
+        # messages committed since the last sync, by this worker or another
+        started = datetime.utcnow()
+        since = ring.synced_from - timedelta(seconds=RESUME_OVERLAP_SECONDS)
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ChatMessage)
+                .options(joinedload(ChatMessage.sender))
+                .filter(ChatMessage.group_id == group_id)
+                .filter(ChatMessage.timestamp >= since)
+                .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+                .limit(self.ring_size)
+                .all()
+            )
+            payloads = [message_payload(msg) for msg in rows]
+        finally:
+            db.close()
+
+        if len(payloads) == self.ring_size:
+            # more came in than the ring holds, start over
+            return self._warm(group_id)
+
+        metrics.inc("chat_history_refreshes_total")
+        with self._lock:
+            if self.rings.get(group_id) is not ring:
+                # evicted or rewarmed meanwhile
+                return ring
+            known = {entry[0] for entry in ring.entries}
+            for payload in payloads:
+                if payload["message"]["id"] not in known:
+                    self.size += ring.append(payload["message"]["id"], payload)
+            ring.synced_at = time.monotonic()
+            ring.synced_from = started
+            self._evict(keep=group_id)
+        return ring
+
+    def _warm(self, group_id: int):
+        # load the newest messages of a group the ring doesn't know yet
+        started = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ChatMessage)
+                .options(joinedload(ChatMessage.sender))
+                .filter(ChatMessage.group_id == group_id)
+                .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+                .limit(self.ring_size)
+                .all()
+            )
+            payloads = [message_payload(msg) for msg in reversed(rows)]
+            if len(payloads) < self.ring_size:
+                # the rest may have been moved to the archive, which only
+                # holds messages older than anything still in the table
+                archived = archived_before(db, group_id, None, self.ring_size - len(payloads))
+                archived.sort(key=lambda p: (sent_at(p), p["message"]["id"]))
+                payloads = archived + payloads
+        finally:
+            db.close()
+
+        ring = GroupRing(self.ring_size)
+        for payload in payloads:
+            ring.append(payload["message"]["id"], payload)
+        # fewer rows than the ring holds means we have the whole history
+        ring.covered_since = datetime.min if len(payloads) < self.ring_size else sent_at(payloads[0])
+        ring.synced_at = time.monotonic()
+        ring.synced_from = started
+
+        with self._lock:
+            # keep what was recorded while we were reading, e.g. messages
+            # still waiting in the write-behind pipeline
+            loaded = {p["message"]["id"] for p in payloads}
+            current = self.rings.get(group_id)
+            if current is not None:
+                self.size -= current.size
+                for entry in current.entries:
+                    if entry[0] not in loaded:
+                        ring.append(entry[0], entry[1])
+            self.rings[group_id] = ring
+            self.rings.move_to_end(group_id)
+            self.size += ring.size
+            self._evict(keep=group_id)
+
+        return ring
+
+    def recent_json(self, group_id: int, limit: int) -> str:
+        """
+        The newest `limit` messages of a group as a JSON array, served from
+        the ring when it covers them, otherwise after warming it from the DB.
+        Either way it's at most HISTORY_TTL_SECONDS behind other workers.
+        """
+        ring = self._fresh(group_id)
+        with self._lock:
+            items = ring.latest(limit) if ring is not None else None
+            if items is not None and group_id in self.rings:
+                self.rings.move_to_end(group_id)
+
+        if items is None:
+            metrics.inc("chat_history_reads_total", source="database")
+            ring = self._warm(group_id)
+            with self._lock:
+                items = ring.latest(limit)
+            if items is None:
+                # ring smaller than the page asked for
+                items = [entry[2] for entry in sorted(ring.entries, key=_order)[-limit:]]
+        else:
+            metrics.inc("chat_history_reads_total", source="buffer")
+
+        return "[" + ",".join(items) + "]"
+
+    def _cursor(self, db, group_id: int, last_id: int):
+        # send time of the client's last message, wherever it lives now
+        with self._lock:
+            ring = self.rings.get(group_id)
+            entry = next((e for e in ring.entries if e[0] == last_id), None) if ring is not None else None
+        if entry is not None:
+            return entry[4]
+        timestamp = db.execute(
+            select(ChatMessage.timestamp)
+            .where(ChatMessage.id == last_id)
+            .where(ChatMessage.group_id == group_id)
+        ).scalar()
+        return timestamp or archived_timestamp(db, group_id, last_id)
+
+    def missed(self, group_id: int, last_id: int):
+        """
+        Messages of a group sent after message last_id, and where they came
+        from. The gap starts RESUME_OVERLAP_SECONDS before last_id was sent
+        and is ordered by (timestamp, id), so it can repeat a few messages
+        the client already has. Falls back to the database, and the archive
+        behind it, only when the gap is older than the ring.
+        """
+        payloads = self.since(group_id, last_id)
+        if payloads is not None:
+            return payloads, "buffer"
+
+        db = SessionLocal()
+        try:
+            cursor = self._cursor(db, group_id, last_id)
+            query = (
+                db.query(ChatMessage)
+                .options(joinedload(ChatMessage.sender))
+                .filter(ChatMessage.group_id == group_id)
+                .filter(ChatMessage.id != last_id)
+                .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+            )
+            if cursor is not None:
+                since = cursor - timedelta(seconds=RESUME_OVERLAP_SECONDS)
+                query = query.filter(ChatMessage.timestamp >= since)
+                # part of the gap may be archived already
+                archived = archived_since(db, group_id, since, MAX_REPLAY)
+            else:
+                # an id we never stored (0 for "everything"): best effort by id
+                since = None
+                query = query.filter(ChatMessage.id > last_id)
+                archived = []
+            payloads = [message_payload(msg) for msg in query.limit(MAX_REPLAY).all()]
+            if archived:
+                payloads = ([p for p in archived if p["message"]["id"] != last_id] + payloads)[:MAX_REPLAY]
+        finally:
+            db.close()
+
+        # messages still queued in the write-behind pipeline are only in the ring
+        seen = {p["message"]["id"] for p in payloads}
+        with self._lock:
+            ring = self.rings.get(group_id)
+            pending = list(ring.entries) if ring is not None else []
+        if len(payloads) < MAX_REPLAY:
+            payloads += [
+                entry[1] for entry in sorted(pending, key=_order)
+                if entry[0] not in seen and entry[0] != last_id
+                and (entry[4] >= since if since is not None else entry[0] > last_id)
+            ]
+
+        return payloads, "database"
+
+
+chat_history = ChatHistory()
@@ -0,0 +1,212 @@
+# services/chat_pipeline.py
+
+import asyncio
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert, select, func, text
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, engine
+from models import ChatMessage, ChatArchive
+from services import group_stats
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "50"))
+FLUSH_BATCH_SIZE = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", "200"))
+ID_BLOCK_SIZE = 100
+MAX_FLUSH_RETRIES = 3
+
+
+class ChatIdAllocator:
+    """
+    Hands out chat_messages ids before the row is written, so a message can
+    be broadcast while its insert is still queued. Ids are reserved in blocks
+    from the postgres sequence; other databases fall back to max(id), which
+    is only safe with a single worker. With several workers ids don't follow
+    send order, so history and resume order by (timestamp, id) instead.
+    """
+
+    def __init__(self, block_size: int = ID_BLOCK_SIZE):
+        self.block_size = block_size
+        self._ids = deque()
+        self._highest = 0
+        self._lock = threading.Lock()
+
+    def needs_refill(self) -> bool:
+        return not self._ids
+
+    def next_id(self) -> int:
+        with self._lock:
+            if not self._ids:
+                self._ids.extend(self._reserve_block())
+            return self._ids.popleft()
+
+    async def next_id_async(self) -> int:
+        # only hop to a thread when the block is used up and we hit the DB
+        if self.needs_refill():
+            return await run_in_threadpool(self.next_id)
+        return self.next_id()
+
+    def _reserve_block(self) -> list[int]:
+        db = SessionLocal()
+        try:
+            if engine.dialect.name == "postgresql":
+                ids = db.execute(
+                    text(
+                        "SELECT nextval(pg_get_serial_sequence('chat_messages', 'id')) "
+                        "FROM generate_series(1, :n)"
+                    ),
+                    {"n": self.block_size}
+                ).scalars().all()
+                ids = sorted(ids)
+            else:
+                highest = max(
+                    db.execute(select(func.max(ChatMessage.id))).scalar() or 0,
+                    # archived ids are gone from chat_messages but must not be reused
+                    db.execute(select(func.max(ChatArchive.last_id))).scalar() or 0
+                )
+                start = max(highest, self._highest) + 1
+                ids = list(range(start, start + self.block_size))
+        finally:
+            db.close()
+
+        self._highest = max(self._highest, ids[-1])
+        return ids
+
+
+chat_ids = ChatIdAllocator()
+
+
+class ChatIngestPipeline:
+    """
+    Write-behind queue for user chat messages. Messages get an id and are
+    broadcast straight away; rows are persisted in micro-batches (every
+    FLUSH_INTERVAL_MS or FLUSH_BATCH_SIZE messages) with one multi-row insert.
+    Each submitted message comes with a future that resolves once it is
+    committed, for clients that ask for a durable ack. A batch that can't be
+    written falls back to one insert per row, so only the bad rows fail.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, group_id: int, sender_id: int, content: str):
+        row = {
+            "id": await chat_ids.next_id_async(),
+            "group_id": group_id,
+            "sender_id": sender_id,
+            "sender_type": "user",
+            "content": content,
+            "timestamp": datetime.utcnow()
+        }
+        persisted = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, persisted))
+        return row, persisted
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = loop.time() + FLUSH_INTERVAL_MS / 1000
+
+            while len(batch) < FLUSH_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+        # drain whatever was queued behind the stop marker
+        leftover = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            await self._flush(leftover)
+
+    async def _flush(self, batch):
+        rows = [row for row, _ in batch]
+        error = await self._insert_with_retries(rows)
+
+        if error is not None and len(batch) > 1:
+            # one bad row (e.g. its group was just deleted) must not sink
+            # the messages of every other group in the batch
+            print(f"Chat flush of {len(rows)} messages failed, inserting them one by one")
+            for row, persisted in batch:
+                self._settle(row, persisted, await self._insert_with_retries([row], attempts=1))
+            return
+
+        for row, persisted in batch:
+            self._settle(row, persisted, error)
+
+    async def _insert_with_retries(self, rows: list[dict], attempts: int = MAX_FLUSH_RETRIES):
+        for attempt in range(attempts):
+            try:
+                await run_in_threadpool(self._insert, rows)
+                return None
+            except IntegrityError as e:
+                # the same rows will break the same constraint again
+                print(f"Chat flush of {len(rows)} messages rejected: {str(e)}")
+                return e
+            except Exception as e:
+                error = e
+                print(f"Chat flush of {len(rows)} messages failed (attempt {attempt + 1}): {str(e)}")
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+        return error
+
+    @staticmethod
+    def _settle(row: dict, persisted: asyncio.Future, error: Exception | None):
+        if persisted.done():
+            return
+        if error:
+            persisted.set_exception(error)
+            # only ack waiters look at the outcome, don't warn about the rest
+            persisted.exception()
+        else:
+            persisted.set_result(row["id"])
+
+    @staticmethod
+    def _insert(rows: list[dict]):
+        db = SessionLocal()
+        try:
+            db.execute(insert(ChatMessage), rows)
+            group_stats.touch_many(db, rows)
+            db.commit()
+        finally:
+            db.close()
+
+
+chat_pipeline = ChatIngestPipeline()
@@ -0,0 +1,131 @@
+# services/connection_registry.py
+
+import asyncio
+import os
+import time
+from fastapi import WebSocket
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("CHAT_HEARTBEAT_INTERVAL_SECONDS", "20"))
+# a socket that sent nothing (not even a pong) for this long is reaped
+IDLE_TIMEOUT_SECONDS = float(os.getenv("CHAT_IDLE_TIMEOUT_SECONDS", "60"))
+
+
+class ChatConnection:
+    __slots__ = ("websocket", "user_id", "user_name", "codec", "groups", "connected_at", "last_activity")
+
+    def __init__(self, websocket: WebSocket, user_id: int, user_name: str | None = None, codec: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.user_name = user_name
+        self.codec = codec
+        self.groups: set[int] = set()
+        self.connected_at = time.time()
+        self.last_activity = time.monotonic()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+
+class ConnectionRegistry:
+    """
+    Live chat sockets, indexed by group. Everything is kept in sets so
+    subscribe/unsubscribe/drop are O(1) no matter how busy the group is.
+    A background task pings every socket and reaps the ones gone quiet.
+    """
+
+    def __init__(self):
+        self._connections: dict[WebSocket, ChatConnection] = {}
+        self._groups: dict[int, set[ChatConnection]] = {}
+        self._send = None
+        self._task: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self._connections)
+
+    def register(self, websocket: WebSocket, user_id: int, user_name: str | None = None, codec: str = "json") -> ChatConnection:
+        conn = ChatConnection(websocket, user_id, user_name, codec)
+        self._connections[websocket] = conn
+        return conn
+
+    def get(self, websocket: WebSocket) -> ChatConnection | None:
+        return self._connections.get(websocket)
+
+    def subscribe(self, conn: ChatConnection, group_id: int):
+        conn.groups.add(group_id)
+        self._groups.setdefault(group_id, set()).add(conn)
+
+    def unsubscribe(self, conn: ChatConnection, group_id: int):
+        conn.groups.discard(group_id)
+        members = self._groups.get(group_id)
+        if members is not None:
+            members.discard(conn)
+            if not members:
+                del self._groups[group_id]
+
+    def unregister(self, conn: ChatConnection):
+        for group_id in list(conn.groups):
+            self.unsubscribe(conn, group_id)
+        self._connections.pop(conn.websocket, None)
+
+    def group(self, group_id: int) -> tuple[ChatConnection, ...]:
+        # snapshot, callers may await between sends
+        return tuple(self._groups.get(group_id, ()))
+
+    def connections(self) -> tuple[ChatConnection, ...]:
+        return tuple(self._connections.values())
+
+    def start(self, send):
+        self._send = send
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def drop(self, conn: ChatConnection, code: int = 1001):
+        self.unregister(conn)
+        try:
+            await conn.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def drop_group(self, group_id: int, code: int = 1008):
+        # the group is gone: its sockets stop listening to it, and the ones
+        # left with no group at all are closed
+        for conn in self.group(group_id):
+            self.unsubscribe(conn, group_id)
+            if not conn.groups:
+                await self.drop(conn, code)
+
+    async def drop_member(self, group_id: int, user_id: int, code: int = 1008):
+        # the user left or was removed: same as drop_group, for their sockets only
+        for conn in self.group(group_id):
+            if conn.user_id != user_id:
+                continue
+            self.unsubscribe(conn, group_id)
+            if not conn.groups:
+                await self.drop(conn, code)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            now = time.monotonic()
+
+            for conn in self.connections():
+                if now - conn.last_activity > IDLE_TIMEOUT_SECONDS:
+                    print(f"Reaping idle chat socket of user {conn.user_id}")
+                    await self.drop(conn)
+                else:
+                    asyncio.create_task(self._send(conn, {"event": "ping", "ts": time.time()}))
+
+
+registry = ConnectionRegistry()
@@ -0,0 +1,86 @@
+# services/event_stream.py
+
+import asyncio
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# events buffered per SSE client before it is considered too slow and cut off
+STREAM_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+STREAM_KEEPALIVE_SECONDS = 15
+
+# which broadcast events reach SSE clients (typing and acks stay on sockets)
+STREAMED_EVENTS = ("message", "bot_message")
+
+
+def sse_event_name(payload: dict) -> str:
+    if payload.get("event") == "bot_message":
+        # expense_added, settlement_paid, member_joined ... when known
+        return payload.get("kind") or "bot_message"
+    return payload.get("event", "message")
+
+
+def format_sse(payload: dict) -> str:
+    lines = []
+    message = payload.get("message") or {}
+    if "id" in message:
+        lines.append(f"id: {message['id']}")
+    lines.append(f"event: {sse_event_name(payload)}")
+    lines.append(f"data: {json.dumps(payload)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class GroupStreams:
+    """
+    Fan-out of the broadcast bus to Server-Sent Events clients. Every
+    subscriber gets a bounded queue; one that falls behind is closed and
+    resumes with Last-Event-ID instead of holding memory for the group.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, group_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(group_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, group_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(group_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[group_id]
+
+    def publish(self, group_id: int, payload: dict):
+        if payload.get("event") not in STREAMED_EVENTS:
+            return
+        for queue in tuple(self._subscribers.get(group_id, ())):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.unsubscribe(group_id, queue)
+                # wake the stream so it notices and ends
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def close_group(self, group_id: int):
+        for queue in tuple(self._subscribers.get(group_id, ())):
+            self.unsubscribe(group_id, queue)
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def close_all(self):
+        # end every stream, clients come back with Last-Event-ID
+        for group_id in list(self._subscribers):
+            self.close_group(group_id)
+
+    def __len__(self):
+        return sum(len(s) for s in self._subscribers.values())
+
+
+group_streams = GroupStreams()
@@ -0,0 +1,77 @@
+# services/graceful_shutdown.py
+
+import asyncio
+import os
+import random
+from services.connection_registry import registry, ChatConnection
+from services.event_stream import group_streams
+from services.outbox import outbox_dispatcher
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# clients are told to come back at a random point in this window, so the
+# sockets of a restarted worker don't all land on the new ones at once
+RECONNECT_SPREAD_MS = int(os.getenv("CHAT_RECONNECT_SPREAD_MS", "10000"))
+RECONNECT_MIN_MS = 500
+
+# "service restart": the close code uvicorn uses too, clients retry on it
+CLOSE_SERVICE_RESTART = 1012
+
+
+def reconnect_frame() -> dict:
+    return {
+        "event": "reconnect",
+        "retry_after_ms": random.randint(RECONNECT_MIN_MS, max(RECONNECT_MIN_MS, RECONNECT_SPREAD_MS))
+    }
+
+
+class GracefulShutdown:
+    """
+    Winds the chat down before the worker goes away: new sockets and
+    streams are turned away, bot messages already committed are delivered,
+    then every socket is told when to reconnect (with jitter) and closed
+    with 1012 and every SSE stream is ended. Safe to call more than once.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self._drained: asyncio.Event | None = None
+        self._send = None
+
+    def start(self, send):
+        # send(conn, payload), the chat router's codec aware sender
+        self._send = send
+        self.draining = False
+        self._drained = None
+
+    async def drain(self):
+        if self._drained is not None:
+            await self._drained.wait()
+            return
+        self.draining = True
+        self._drained = asyncio.Event()
+
+        try:
+            await outbox_dispatcher.drain()
+        except Exception as e:
+            print(f"Outbox drain on shutdown failed: {str(e)}")
+
+        connections = registry.connections()
+        if connections:
+            print(f"Draining {len(connections)} chat sockets")
+            await asyncio.gather(*(self._close(conn) for conn in connections))
+
+        group_streams.close_all()
+        self._drained.set()
+
+    async def _close(self, conn: ChatConnection):
+        try:
+            await self._send(conn, reconnect_frame())
+        except Exception:
+            pass
+        await registry.drop(conn, code=CLOSE_SERVICE_RESTART)
+
+
+graceful_shutdown = GracefulShutdown()
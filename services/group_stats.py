@@ -0,0 +1,171 @@
+# services/group_stats.py
+
+import asyncio
+import os
+from datetime import datetime
+from sqlalchemy import select, update, func, case, or_, bindparam
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import Group, Expense, ChatMessage, group_members
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+GROUP_STATS_RECONCILE_SECONDS = float(os.getenv("GROUP_STATS_RECONCILE_SECONDS", "3600"))
+# groups checked per transaction
+GROUP_STATS_BATCH_SIZE = int(os.getenv("GROUP_STATS_BATCH_SIZE", "500"))
+
+metrics.describe("group_stats_repaired_total", "Group counters that had drifted and were rewritten by the reconciler")
+
+
+def _later(column, at):
+    # never move last_activity_at backwards
+    return case((or_(column.is_(None), column < at), at), else_=column)
+
+
+def bump(db, group_id: int, members: int = 0, expenses: int = 0, spent: float = 0, at: datetime | None = None):
+    """
+    Adjust a group's counters inside the caller's transaction, so they
+    commit or roll back with the rows they count.
+    """
+    at = at or datetime.utcnow()
+    db.execute(
+        update(Group)
+        .where(Group.id == group_id)
+        .values(
+            member_count=Group.member_count + members,
+            expense_count=Group.expense_count + expenses,
+            total_spent=Group.total_spent + spent,
+            last_activity_at=_later(Group.last_activity_at, at)
+        )
+    )
+
+
+def touch_many(db, rows: list[dict]):
+    # last activity for a batch of chat message rows, one update per group
+    latest = {}
+    for row in rows:
+        if row["group_id"] not in latest or row["timestamp"] > latest[row["group_id"]]:
+            latest[row["group_id"]] = row["timestamp"]
+    if not latest:
+        return
+
+    db.connection().execute(
+        update(Group.__table__)
+        .where(Group.__table__.c.id == bindparam("gid"))
+        .values(last_activity_at=_later(Group.__table__.c.last_activity_at, bindparam("at"))),
+        [{"gid": gid, "at": at} for gid, at in latest.items()]
+    )
+
+
+def _actual():
+    # what the counters should be, as correlated subqueries on Group
+    return (
+        select(func.count()).select_from(group_members)
+        .where(group_members.c.group_id == Group.id).scalar_subquery(),
+        select(func.count()).select_from(Expense)
+        .where(Expense.group_id == Group.id).scalar_subquery(),
+        select(func.coalesce(func.sum(Expense.amount), 0))
+        .where(Expense.group_id == Group.id).scalar_subquery(),
+        select(func.max(ChatMessage.timestamp))
+        .where(ChatMessage.group_id == Group.id).scalar_subquery(),
+    )
+
+
+class GroupStatsReconciler:
+    """
+    Recomputes every group's counters from the source tables each
+    GROUP_STATS_RECONCILE_SECONDS and rewrites the ones that drifted
+    (a write path that forgot to bump, rows changed by hand, ...).
+    last_activity_at only moves forward, since archived messages leave
+    chat_messages.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(GROUP_STATS_RECONCILE_SECONDS)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"Group stats reconcile failed: {str(e)}")
+
+    async def reconcile(self) -> int:
+        repaired = 0
+        after = 0
+        while True:
+            fixed, after = await run_in_threadpool(self._reconcile_batch, after)
+            repaired += fixed
+            if after is None:
+                break
+        if repaired:
+            print(f"Group stats reconciler repaired {repaired} groups")
+        return repaired
+
+    @staticmethod
+    def _reconcile_batch(after: int):
+        members, expenses, spent, last_message = _actual()
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(
+                    Group.id, Group.member_count, Group.expense_count, Group.total_spent, Group.last_activity_at,
+                    members.label("members"), expenses.label("expenses"),
+                    spent.label("spent"), last_message.label("last_message")
+                )
+                .where(Group.id > after)
+                .order_by(Group.id)
+                .limit(GROUP_STATS_BATCH_SIZE)
+            ).all()
+
+            drifted = [
+                row.id for row in rows
+                if row.member_count != row.members
+                or row.expense_count != row.expenses
+                or abs(row.total_spent - row.spent) > 0.005
+                or (row.last_message is not None and (row.last_activity_at is None or row.last_activity_at < row.last_message))
+            ]
+            if drifted:
+                # recomputed in the update itself, so bumps committed since the read aren't lost
+                db.execute(
+                    update(Group)
+                    .where(Group.id.in_(drifted))
+                    .values(
+                        member_count=members,
+                        expense_count=expenses,
+                        total_spent=spent,
+                        last_activity_at=case(
+                            (last_message.is_(None), Group.last_activity_at),
+                            else_=_later(Group.last_activity_at, last_message)
+                        )
+                    ),
+                    execution_options={"synchronize_session": False}
+                )
+                db.commit()
+        finally:
+            db.close()
+
+        if drifted:
+            metrics.inc("group_stats_repaired_total", len(drifted))
+        next_after = rows[-1].id if len(rows) == GROUP_STATS_BATCH_SIZE else None
+        return len(drifted), next_after
+
+
+group_stats_reconciler = GroupStatsReconciler()
@@ -0,0 +1,90 @@
+# services/janitor.py
+
+import asyncio
+import os
+from datetime import datetime
+from sqlalchemy import select, delete, or_
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import OTPVerification, GroupInvite, RefreshToken
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+JANITOR_INTERVAL_SECONDS = float(os.getenv("JANITOR_INTERVAL_SECONDS", "600"))
+# rows per delete statement, so a big backlog never holds long locks
+JANITOR_BATCH_SIZE = int(os.getenv("JANITOR_BATCH_SIZE", "1000"))
+
+metrics.describe("janitor_purged_rows_total", "Expired or used rows deleted by the janitor, by table")
+
+
+def _purgeable():
+    # (model, condition) pairs, evaluated fresh each run
+    now = datetime.utcnow()
+    return [
+        (OTPVerification, OTPVerification.expires_at < now),
+        (GroupInvite, or_(GroupInvite.used == True, GroupInvite.expires_at < now)),
+        (RefreshToken, RefreshToken.expires_at < now),
+    ]
+
+
+class Janitor:
+    """
+    Deletes expired OTPs, used or expired invites and expired refresh
+    tokens every JANITOR_INTERVAL_SECONDS, JANITOR_BATCH_SIZE rows per
+    transaction.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                for model, condition in _purgeable():
+                    purged = 0
+                    while True:
+                        deleted = await run_in_threadpool(self._purge_batch, model, condition)
+                        purged += deleted
+                        if deleted < JANITOR_BATCH_SIZE:
+                            break
+                    if purged:
+                        print(f"Janitor purged {purged} rows from {model.__tablename__}")
+            except Exception as e:
+                print(f"Janitor run failed: {str(e)}")
+            await asyncio.sleep(JANITOR_INTERVAL_SECONDS)
+
+    @staticmethod
+    def _purge_batch(model, condition) -> int:
+        db = SessionLocal()
+        try:
+            ids = db.execute(
+                select(model.id).where(condition).limit(JANITOR_BATCH_SIZE)
+            ).scalars().all()
+            if not ids:
+                return 0
+            db.execute(delete(model).where(model.id.in_(ids)))
+            db.commit()
+        finally:
+            db.close()
+
+        metrics.inc("janitor_purged_rows_total", len(ids), table=model.__tablename__)
+        return len(ids)
+
+
+janitor = Janitor()
@@ -0,0 +1,118 @@
+# services/loop_monitor.py
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+LOOP_TICK_SECONDS = float(os.getenv("LOOP_TICK_SECONDS", "0.1"))
+# a callback holding the loop longer than this gets its stack logged
+SLOW_CALLBACK_SECONDS = float(os.getenv("SLOW_CALLBACK_SECONDS", "0.2"))
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+metrics.describe("event_loop_lag_seconds", "How late the loop monitor tick woke up")
+metrics.describe("event_loop_stalls_total", "Loop stalls longer than SLOW_CALLBACK_SECONDS, by route and handler")
+metrics.describe("event_loop_stall_seconds", "Duration of detected loop stalls")
+
+
+def _describe_stack(frame):
+    """
+    Returns (route, handler, formatted stack) for the frame the loop is
+    stuck in. The handler is the innermost frame from our own code, the
+    route comes from the ASGI scope of the request being served.
+    """
+    stack = traceback.extract_stack(frame)
+    handler = f"{os.path.basename(stack[-1].filename)}:{stack[-1].name}" if stack else "unknown"
+    for entry in reversed(stack):
+        if entry.filename.startswith(PROJECT_ROOT) and "site-packages" not in entry.filename:
+            handler = f"{os.path.relpath(entry.filename, PROJECT_ROOT)}:{entry.name}"
+            break
+
+    route = "-"
+    f = frame
+    while f is not None:
+        scope = f.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") in ("http", "websocket"):
+            matched = scope.get("route")
+            route = getattr(matched, "path", None) or scope.get("path", "-")
+            break
+        f = f.f_back
+
+    return route, handler, "".join(traceback.format_list(stack))
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag with a ticking task, and runs a watchdog thread
+    that notices when the tick stops beating. When the loop is held longer
+    than SLOW_CALLBACK_SECONDS the watchdog captures the loop thread's stack,
+    so blocking calls show up with the route and handler that made them.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _tick(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LOOP_TICK_SECONDS)
+            lag = time.perf_counter() - started - LOOP_TICK_SECONDS
+            metrics.observe("event_loop_lag_seconds", max(lag, 0))
+            metrics.set("event_loop_lag_last_seconds", max(lag, 0))
+            self._last_beat = time.monotonic()
+
+    def _watch(self):
+        reported_beat = None
+
+        while not self._stop.wait(SLOW_CALLBACK_SECONDS / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - LOOP_TICK_SECONDS
+            if stalled < SLOW_CALLBACK_SECONDS or beat == reported_beat:
+                continue
+
+            # one report per stall, taken while the loop is still stuck
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            route, handler, stack = _describe_stack(frame)
+            metrics.inc("event_loop_stalls_total", route=route, handler=handler)
+            metrics.observe("event_loop_stall_seconds", stalled)
+            print(f"Event loop blocked for {stalled * 1000:.0f}ms in {handler} (route {route}):\n{stack}")
+
+
+loop_monitor = LoopMonitor()
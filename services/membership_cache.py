@@ -0,0 +1,68 @@
+# services/membership_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# short: other workers only see a membership change after this long
+MEMBERSHIP_CACHE_TTL_SECONDS = float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "10"))
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "50000"))
+
+metrics.describe("membership_cache_requests_total", "Group membership lookups, by whether they were cached")
+
+# what's cached for a (group, user) pair that has no row in group_members
+NO_GROUP = "no_group"
+NOT_MEMBER = "not_member"
+
+
+class MembershipCache:
+    """
+    (group_id, user_id) -> role, NOT_MEMBER or NO_GROUP, for
+    MEMBERSHIP_CACHE_TTL_SECONDS. Routes that change group_members
+    invalidate the pairs they touch once they have committed.
+    """
+
+    def __init__(self, ttl: float = MEMBERSHIP_CACHE_TTL_SECONDS, max_size: int = MEMBERSHIP_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[int, int], tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, group_id: int, user_id: int) -> str | None:
+        key = (group_id, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                metrics.inc("membership_cache_requests_total", result="hit")
+                return entry[1]
+            self._entries.pop(key, None)
+        metrics.inc("membership_cache_requests_total", result="miss")
+        return None
+
+    def put(self, group_id: int, user_id: int, status: str):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(group_id, user_id)] = (time.monotonic() + self.ttl, status)
+            self._entries.move_to_end((group_id, user_id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, group_id: int, user_id: int):
+        with self._lock:
+            self._entries.pop((group_id, user_id), None)
+
+    def invalidate_group(self, group_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == group_id]:
+                del self._entries[key]
+
+
+membership_cache = MembershipCache()
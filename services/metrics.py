@@ -0,0 +1,86 @@
+# services/metrics.py
+
+import threading
+
+
+class Metrics:
+    """
+    Tiny in-process metrics store rendered in the Prometheus text format.
+    Counters only go up, gauges are set, summaries keep count/sum/max.
+    Safe to update from the event loop and from threadpool threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._summaries: dict[tuple, list[float]] = {}
+        self._help: dict[str, str] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                summary[2] = max(summary[2], value)
+
+    def value(self, name: str, **labels) -> float:
+        key = self._key(name, labels)
+        return self._counters.get(key, self._gauges.get(key, 0))
+
+    @staticmethod
+    def _labels(labels: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{str(v)}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                header(name, "counter")
+                lines.append(f"{name}{self._labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                header(name, "gauge")
+                lines.append(f"{name}{self._labels(labels)} {value}")
+            for (name, labels), (count, total, peak) in sorted(self._summaries.items()):
+                header(name, "summary")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                lines.append(f"{name}_max{self._labels(labels)} {peak}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,194 @@
+# services/notifications.py
+
+import asyncio
+import json
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# loopback | file; a real SMS gateway is another NotificationProvider
+NOTIFICATION_PROVIDER = os.getenv("NOTIFICATION_PROVIDER", "loopback")
+NOTIFICATION_FILE = os.getenv("NOTIFICATION_FILE", "notifications.log")
+NOTIFICATION_QUEUE_SIZE = int(os.getenv("NOTIFICATION_QUEUE_SIZE", "10000"))
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "4"))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+# how long a worker waits for more messages to fill a provider batch
+BATCH_WINDOW_SECONDS = 0.02
+RETRY_BASE_SECONDS = 0.5
+DRAIN_TIMEOUT_SECONDS = 5
+
+metrics.describe("notifications_sent_total", "Notifications accepted by the provider, by kind")
+metrics.describe("notifications_retried_total", "Notification sends that failed and were scheduled again")
+metrics.describe("notifications_failed_total", "Notifications dropped after NOTIFICATION_MAX_ATTEMPTS or a full queue")
+metrics.describe("notification_batch_seconds", "Time the provider took per batch")
+
+
+class Notification:
+    __slots__ = ("to", "body", "kind", "attempts")
+
+    def __init__(self, to: str, body: str, kind: str = "otp"):
+        self.to = to
+        self.body = body
+        self.kind = kind
+        self.attempts = 0
+
+
+class NotificationProvider(ABC):
+    """
+    Delivers a batch and returns the notifications that failed, which are
+    retried with backoff. `echoes_otp` marks stand-ins that deliver nowhere
+    a user can read, so the API keeps returning the OTP for them.
+    """
+
+    max_batch = 1
+    echoes_otp = False
+
+    @abstractmethod
+    async def send_batch(self, batch: list[Notification]) -> list[Notification]:
+        ...
+
+
+class LoopbackProvider(NotificationProvider):
+    # keeps the last messages in memory and prints them, for dev and tests
+    max_batch = 100
+    echoes_otp = True
+
+    def __init__(self, keep: int = 1000):
+        self.sent = deque(maxlen=keep)
+
+    async def send_batch(self, batch):
+        for n in batch:
+            print(f"{n.kind.upper()} for {n.to}: {n.body}")
+            self.sent.append(n)
+        return []
+
+
+class FileProvider(NotificationProvider):
+    # appends one JSON line per message, for local setups that want a trail
+    max_batch = 100
+    echoes_otp = True
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def send_batch(self, batch):
+        lines = "".join(
+            json.dumps({"to": n.to, "kind": n.kind, "body": n.body, "at": datetime.utcnow().isoformat()}) + "\n"
+            for n in batch
+        )
+        await run_in_threadpool(self._append, lines)
+        return []
+
+    def _append(self, lines: str):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def provider_from_env() -> NotificationProvider:
+    if NOTIFICATION_PROVIDER == "file":
+        return FileProvider(NOTIFICATION_FILE)
+    return LoopbackProvider()
+
+
+class NotificationQueue:
+    """
+    Outbound messages (OTP SMS today) sent off the request path. Handlers
+    enqueue and return; NOTIFICATION_WORKERS tasks hand batches to the
+    provider, and failures come back after exponential backoff with jitter
+    until NOTIFICATION_MAX_ATTEMPTS.
+    """
+
+    def __init__(self):
+        self.provider: NotificationProvider = provider_from_env()
+        self._loop = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def echoes_otp(self) -> bool:
+        return self.provider.echoes_otp
+
+    def start(self, provider: NotificationProvider | None = None):
+        if provider is not None:
+            self.provider = provider
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=NOTIFICATION_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._run()) for _ in range(NOTIFICATION_WORKERS)]
+
+    async def stop(self):
+        if not self._workers:
+            return
+        # give what's already queued a chance to go out
+        try:
+            await asyncio.wait_for(self._queue.join(), DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            print(f"Dropping {self._queue.qsize()} queued notifications on shutdown")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, notification: Notification):
+        # callable from request threads as well as from the loop
+        if self._loop is None:
+            raise RuntimeError("notification queue is not running")
+        self._loop.call_soon_threadsafe(self._put, notification)
+
+    def _put(self, notification: Notification):
+        try:
+            self._queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            metrics.inc("notifications_failed_total", reason="queue_full")
+            print(f"Notification queue full, dropped {notification.kind} for {notification.to}")
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+            while len(batch) < self.provider.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.monotonic()
+            try:
+                failed = await self.provider.send_batch(batch)
+            except Exception as e:
+                print(f"Notification provider failed: {str(e)}")
+                failed = batch
+            metrics.observe("notification_batch_seconds", time.monotonic() - started)
+
+            failed_ids = {id(n) for n in failed}
+            for n in batch:
+                if id(n) not in failed_ids:
+                    metrics.inc("notifications_sent_total", kind=n.kind)
+            for n in failed:
+                self._retry(n)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _retry(self, notification: Notification):
+        notification.attempts += 1
+        if notification.attempts >= NOTIFICATION_MAX_ATTEMPTS:
+            metrics.inc("notifications_failed_total", reason="attempts")
+            print(f"Giving up on {notification.kind} for {notification.to} after {notification.attempts} attempts")
+            return
+        metrics.inc("notifications_retried_total")
+        delay = RETRY_BASE_SECONDS * 2 ** (notification.attempts - 1) * random.uniform(0.5, 1.5)
+        self._loop.call_later(delay, self._put, notification)
+
+
+notifications = NotificationQueue()
@@ -0,0 +1,134 @@
+# services/outbox.py
+
+import asyncio
+import os
+from sqlalchemy import event, insert, select, delete
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, engine
+from models import ChatMessage, ChatOutbox
+from services.chat_pipeline import chat_ids
+from services import group_stats
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+# safety net for commits we were not told about (other workers, restarts)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+
+
+class OutboxDispatcher:
+    """
+    Drains chat_outbox: each batch becomes chat_messages rows in one
+    multi-row insert, the outbox rows are deleted in the same transaction,
+    and the messages are broadcast once committed. Request handlers only
+    add an outbox row and wake the dispatcher after their commit.
+    """
+
+    def __init__(self):
+        self._send = None
+        self._loop = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, send):
+        self._send = send
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # deliver whatever was committed before shutdown
+        await self.drain()
+
+    def notify_after_commit(self, db: Session):
+        event.listen(db, "after_commit", self._wake, once=True)
+
+    def _wake(self, session=None):
+        # called from the request's threadpool thread
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.drain()
+            except Exception as e:
+                print(f"Outbox dispatch failed: {str(e)}")
+
+    async def drain(self):
+        while True:
+            delivered = await run_in_threadpool(self._claim_batch)
+            for group_id, payload in delivered:
+                await self._send(group_id, payload)
+            if len(delivered) < OUTBOX_BATCH_SIZE:
+                return
+
+    @staticmethod
+    def _claim_batch():
+        db = SessionLocal()
+        try:
+            query = select(ChatOutbox).order_by(ChatOutbox.id).limit(OUTBOX_BATCH_SIZE)
+            if engine.dialect.name == "postgresql":
+                # several workers may drain at once, don't hand a row out twice
+                query = query.with_for_update(skip_locked=True)
+            pending = db.execute(query).scalars().all()
+            if not pending:
+                return []
+
+            rows = [
+                {
+                    "id": chat_ids.next_id(),
+                    "group_id": item.group_id,
+                    "sender_id": None,
+                    "sender_type": "bot",
+                    "content": item.content,
+                    "kind": item.kind,
+                    "data": item.data,
+                    "timestamp": item.created_at
+                }
+                for item in pending
+            ]
+
+            db.execute(insert(ChatMessage), rows)
+            group_stats.touch_many(db, rows)
+            db.execute(delete(ChatOutbox).where(ChatOutbox.id.in_([item.id for item in pending])))
+            db.commit()
+        finally:
+            db.close()
+
+        delivered = []
+        for row in rows:
+            payload = {
+                "event": "bot_message",
+                "message": {
+                    "id": row["id"],
+                    "content": row["content"],
+                    "timestamp": row["timestamp"].isoformat()
+                }
+            }
+            if row["kind"]:
+                payload["kind"] = row["kind"]
+                payload["data"] = row["data"] or {}
+            delivered.append((row["group_id"], payload))
+
+        return delivered
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,87 @@
+# services/password_hasher.py
+#
+# bcrypt is ~250ms of CPU per call at the default work factor. Doing it in
+# the request threadpool lets a burst of logins starve every sync route, so
+# it runs here on its own bounded pool with admission control in front.
+# Worker processes are started fresh (forkserver, or spawn where that's
+# missing) rather than forked from the server, whose event loop and worker
+# threads already run; they import this module to find _hash, so it's kept
+# free of DB and router imports.
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# "process" for real parallelism, "thread" where forking workers isn't wanted
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# hashes running or queued before new ones are turned away with a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 4)))
+
+# hashes with a different work factor are upgraded on the next login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+
+    def __init__(self):
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            if PASSWORD_HASH_EXECUTOR == "thread":
+                self._executor = ThreadPoolExecutor(PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+            else:
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= PASSWORD_HASH_MAX_PENDING:
+            metrics.inc("password_hash_rejected_total")
+            raise HTTPException(
+                status_code=503,
+                detail="too many login attempts in progress, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed: str):
+        """
+        (valid, new_hash). new_hash is set when the stored hash was made
+        with another work factor and should replace it.
+        """
+        return await self._run(_verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,139 @@
+# services/rate_limiter.py
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from fastapi import HTTPException, Request
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # optional, limits stay per process without it
+    redis = None
+
+load_dotenv()
+
+
+# shared limits across workers when set, e.g. redis://localhost:6379/0
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+# behind a proxy the client is the first X-Forwarded-For hop
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+# in-memory keys kept before idle ones are swept
+MAX_TRACKED_KEYS = 100_000
+
+metrics.describe("rate_limited_total", "Requests rejected by the rate limiter, by limit")
+
+
+def parse_limit(value: str):
+    # "5/60" -> 5 requests per 60 seconds
+    count, seconds = value.split("/")
+    return int(count), float(seconds)
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class MemoryWindow:
+    """
+    Sliding window log per key: the timestamps of the requests let through
+    in the last `window` seconds. Only accepted requests are logged, so a
+    client that keeps hammering is let back in once its window has moved on.
+    """
+
+    def __init__(self):
+        # key -> (window, log); the window decides when the key is idle
+        self._logs: dict[str, tuple[float, deque]] = {}
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        # 0 when allowed, else seconds until the next request would be
+        now = time.monotonic()
+        with self._lock:
+            entry = self._logs.get(key)
+            if entry is None:
+                if len(self._logs) >= MAX_TRACKED_KEYS:
+                    self._sweep(now)
+                entry = self._logs[key] = (window, deque())
+            log = entry[1]
+
+            while log and log[0] <= now - window:
+                log.popleft()
+
+            if len(log) >= limit:
+                return log[0] + window - now
+
+            log.append(now)
+            return 0
+
+    def _sweep(self, now: float):
+        # each key against its own window, a short limit mustn't reset a long one
+        for key in [k for k, (window, log) in self._logs.items() if not log or log[-1] <= now - window]:
+            del self._logs[key]
+
+
+class RedisWindow:
+    # same sliding window log, as a sorted set per key, checked atomically
+    SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[1] - ARGV[2])
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+        return redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')[2]
+    end
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], math.ceil(ARGV[2] * 1000))
+    return false
+    """
+
+    def __init__(self, url: str):
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        now = time.time()
+        oldest = await self._script(keys=[f"ratelimit:{key}"], args=[now, window, limit, f"{now}:{uuid.uuid4().hex}"])
+        if oldest is None:
+            return 0
+        return max(float(oldest) + window - now, 0.001)
+
+
+class RateLimiter:
+
+    def __init__(self):
+        self._memory = MemoryWindow()
+        self._shared = None
+        if RATE_LIMIT_REDIS_URL:
+            if redis is None:
+                print("RATE_LIMIT_REDIS_URL is set but redis is not installed, limiting per process")
+            else:
+                self._shared = RedisWindow(RATE_LIMIT_REDIS_URL)
+
+    async def check(self, name: str, key: str, limit: int, window: float):
+        key = f"{name}:{key}"
+        retry_after = 0
+        if self._shared is not None:
+            try:
+                retry_after = await self._shared.hit(key, limit, window)
+            except Exception as e:
+                # don't lock everyone out when redis is down
+                print(f"Shared rate limiter failed, using memory: {str(e)}")
+                retry_after = await self._memory.hit(key, limit, window)
+        else:
+            retry_after = await self._memory.hit(key, limit, window)
+
+        if retry_after:
+            metrics.inc("rate_limited_total", limit=name)
+            raise HTTPException(
+                status_code=429,
+                detail="too many requests, try again later",
+                headers={"Retry-After": str(int(retry_after) + 1)}
+            )
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,135 @@
+# services/token_revocation.py
+
+import asyncio
+import hashlib
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import RevokedToken
+from services.metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+BLOOM_BITS = int(os.getenv("REVOCATION_BLOOM_BITS", str(1 << 20)))  # 128KB
+BLOOM_HASHES = 7
+# how quickly a logout on another worker is picked up here
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "30"))
+
+metrics.describe("revocation_checks_total", "Access token revocation checks, by how they were answered")
+
+
+class BloomFilter:
+
+    def __init__(self, bits: int = BLOOM_BITS, hashes: int = BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray(bits // 8 + 1)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode()).digest()
+        for i in range(self.hashes):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], "big") % self.bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationSet:
+    """
+    Revoked access token ids. The revoked_tokens table is the truth; every
+    worker keeps a Bloom filter of it, so the common case (token not
+    revoked) is answered in memory and only a filter hit costs a primary
+    key lookup. The filter is rebuilt from the table every
+    REVOCATION_SYNC_SECONDS, which also picks up other workers' logouts
+    and lets expired entries fall out.
+    """
+
+    def __init__(self):
+        self._filter = BloomFilter()
+        # revoked here while a sync was reading the table
+        self._since_sync: set[str] = set()
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.sync)
+            except Exception as e:
+                print(f"Revocation sync failed: {str(e)}")
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+
+    def sync(self):
+        with self._lock:
+            self._since_sync = set()
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+            db.commit()
+            jtis = db.execute(select(RevokedToken.jti)).scalars().all()
+        finally:
+            db.close()
+
+        fresh = BloomFilter()
+        for jti in jtis:
+            fresh.add(jti)
+        with self._lock:
+            for jti in self._since_sync:
+                fresh.add(jti)
+            self._filter = fresh
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime):
+        # the caller commits; the filter is updated right away for this worker
+        if db.get(RevokedToken, jti) is None:
+            db.add(RevokedToken(jti=jti, expires_at=expires_at))
+        with self._lock:
+            self._filter.add(jti)
+            self._since_sync.add(jti)
+
+    def might_be_revoked(self, jti: str | None) -> bool:
+        if not jti:
+            return False
+        with self._lock:
+            return jti in self._filter
+
+    def is_revoked(self, jti: str | None, db: Session | None = None) -> bool:
+        if not self.might_be_revoked(jti):
+            metrics.inc("revocation_checks_total", result="filter")
+            return False
+
+        metrics.inc("revocation_checks_total", result="database")
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            return db.get(RevokedToken, jti) is not None
+        finally:
+            if own_session:
+                db.close()
+
+
+revocations = RevocationSet()
@@ -0,0 +1,98 @@
+# services/typing_state.py
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# how often pending typing changes are flushed to the group
+TYPING_TICK_SECONDS = float(os.getenv("TYPING_TICK_SECONDS", "0.5"))
+# a typer is dropped if no typing event arrives for this long
+TYPING_TIMEOUT_SECONDS = float(os.getenv("TYPING_TIMEOUT_SECONDS", "3"))
+# groups with active typers are re-announced this often, so clients that
+# clear the indicator after 3s keep showing it
+TYPING_REFRESH_SECONDS = 2.0
+
+
+class TypingTracker:
+    """
+    Per (group, user) typing state. Keystrokes only touch this state; one
+    coalesced "A, B are typing" frame per group is broadcast on the next
+    tick, and only when the set of typers changed or needs a refresh.
+    """
+
+    def __init__(self):
+        self._typers: dict[int, dict[int, tuple[str, float]]] = {}
+        self._dirty: set[int] = set()
+        self._announced: dict[int, float] = {}
+        self._send = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, send):
+        self._send = send
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def typing(self, group_id: int, user_id: int, user_name: str):
+        group = self._typers.setdefault(group_id, {})
+        if user_id not in group:
+            self._dirty.add(group_id)
+        group[user_id] = (user_name, time.monotonic() + TYPING_TIMEOUT_SECONDS)
+
+    def stopped(self, group_id: int, user_id: int):
+        group = self._typers.get(group_id)
+        if group and group.pop(user_id, None):
+            self._dirty.add(group_id)
+
+    def frame(self, group_id: int) -> dict:
+        group = self._typers.get(group_id, {})
+        users = [{"id": uid, "name": name} for uid, (name, _) in group.items()]
+        return {
+            "event": "typing",
+            "user": ", ".join(u["name"] for u in users),
+            "users": users
+        }
+
+    def _expire(self, now: float):
+        for group_id, group in list(self._typers.items()):
+            for user_id, (_, expires) in list(group.items()):
+                if expires <= now:
+                    del group[user_id]
+                    self._dirty.add(group_id)
+            if not group:
+                del self._typers[group_id]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(TYPING_TICK_SECONDS)
+            now = time.monotonic()
+            self._expire(now)
+
+            due = set(self._dirty)
+            for group_id in self._typers:
+                if now - self._announced.get(group_id, 0) >= TYPING_REFRESH_SECONDS:
+                    due.add(group_id)
+            self._dirty.clear()
+
+            for group_id in due:
+                self._announced[group_id] = now
+                if group_id not in self._typers:
+                    self._announced.pop(group_id, None)
+                try:
+                    await self._send(group_id, self.frame(group_id))
+                except Exception as e:
+                    print(f"Typing broadcast failed for group {group_id}: {str(e)}")
+
+
+typing_tracker = TypingTracker()
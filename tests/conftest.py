@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+# the app reads its settings at import time
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from database import SessionLocal, engine
+from routers.auth import create_access_token
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    # no `with`: the lifespan's background jobs would add their own queries
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def login(client):
+    def log_in(user_id: int):
+        client.cookies.set("access_token", create_access_token({"sub": str(user_id)}))
+    return log_in
+
+
+@pytest.fixture
+def count_queries():
+    # `with count_queries() as counter:` counts statements sent to the DB
+    return QueryCounter
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
@@ -0,0 +1,86 @@
+import uuid
+
+from sqlalchemy import insert
+
+from models import User, Group, Expense, group_members
+
+
+def _make_group(db):
+    users = [
+        User(name=f"user{i}", phone=uuid.uuid4().hex[:12], password_hash="x")
+        for i in range(2)
+    ]
+    db.add_all(users)
+    db.flush()
+    group = Group(name="trip", created_by=users[0].id, member_count=2)
+    db.add(group)
+    db.flush()
+    db.execute(insert(group_members), [
+        {"group_id": group.id, "user_id": users[0].id, "role": "admin"},
+        {"group_id": group.id, "user_id": users[1].id, "role": "member"},
+    ])
+    db.commit()
+    return group.id, [u.id for u in users]
+
+
+def _add_expenses(db, group_id, user_ids, count):
+    db.execute(insert(Expense), [
+        {"group_id": group_id, "paid_by": user_ids[i % len(user_ids)], "amount": 10.0, "note": f"e{i}"}
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def _dashboard_queries(client, count_queries, group_id):
+    # first call fills the auth and membership caches
+    assert client.get(f"/groups/{group_id}").status_code == 200
+    with count_queries() as counter:
+        response = client.get(f"/groups/{group_id}")
+    assert response.status_code == 200
+    return counter.count, response.json()
+
+
+def test_dashboard_query_count_is_constant(client, db, login, count_queries):
+    group_id, user_ids = _make_group(db)
+    login(user_ids[0])
+
+    _add_expenses(db, group_id, user_ids, 10)
+    small, body = _dashboard_queries(client, count_queries, group_id)
+    assert len(body["expenses"]) == 10
+    assert body["next_cursor"] is None
+
+    _add_expenses(db, group_id, user_ids, 9_990)
+    large, body = _dashboard_queries(client, count_queries, group_id)
+    assert len(body["expenses"]) == 20
+    assert body["next_cursor"] is not None
+    assert all(e["payer"] is not None for e in body["expenses"])
+
+    assert small == large
+
+
+def test_expense_pages_return_every_expense_once(client, db, login):
+    group_id, user_ids = _make_group(db)
+    login(user_ids[0])
+    _add_expenses(db, group_id, user_ids, 10_000)
+
+    body = client.get(f"/groups/{group_id}").json()
+    seen = [e["id"] for e in body["expenses"]]
+    cursor = body["next_cursor"]
+    while cursor is not None:
+        page = client.get(f"/groups/{group_id}/expenses", params={"before": cursor, "limit": 100}).json()
+        seen += [e["id"] for e in page["expenses"]]
+        cursor = page["next_cursor"]
+
+    assert len(seen) == 10_000
+    assert len(set(seen)) == 10_000
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_expense_pages_need_membership(client, db, login):
+    group_id, _ = _make_group(db)
+    outsider = User(name="outsider", phone=uuid.uuid4().hex[:12], password_hash="x")
+    db.add(outsider)
+    db.commit()
+    login(outsider.id)
+
+    assert client.get(f"/groups/{group_id}/expenses").status_code == 403